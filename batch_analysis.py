@@ -0,0 +1,471 @@
+import os
+import glob
+import shutil
+import hashlib
+import logging
+import click
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from modules.metrics import metrics
+from modules.onnx_backend import default_intra_op_threads
+
+from conversation_analysis import (
+    ANALYSIS_CHUNK_SIZE,
+    OUTPUT_COLUMNS,
+    OUTPUT_FORMATS,
+    PARTITION_BY,
+    PARTITION_COLUMNS,
+    SENTENCE_TYPE_POLICY,
+    SENTIMENT_BACKEND,
+    SENTIMENT_BACKENDS,
+    SENTIMENT_MODE,
+    SENTIMENT_MODES,
+    cascade_report,
+    iter_conversation_lines,
+    iter_questions_and_answers,
+    load_analysis_models,
+    open_sentiment_cache,
+    padding_stats,
+    sentence_type_policy,
+    set_sentiment_backend,
+    write_questions_and_answers_parquet,
+)
+
+# Column that tags every row of the combined output with its transcript
+SOURCE_COLUMN = "source_file"
+
+
+def find_transcripts(inputs, pattern="*.txt"):
+    """
+    Expand directories and glob patterns into a sorted list of transcript paths.
+
+    Parameters:
+    - inputs (list[str]): Directories, glob patterns or plain file paths.
+    - pattern (str): Glob used to select files inside a directory.
+
+    Returns:
+    - list[str]: Absolute, de-duplicated transcript paths.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "**", pattern), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True)
+        paths.update(os.path.abspath(path) for path in matches if os.path.isfile(path))
+    return sorted(paths)
+
+
+def read_done_manifest(manifest_path):
+    """
+    Return the transcripts already written to the combined output, in completion order.
+
+    Each entry is a `(path, output_size)` pair, where `output_size` is the size of the
+    combined CSV right after the transcript's rows were appended (None for Parquet and
+    for entries written before sizes were recorded). A last line without its newline
+    was cut short by a crash, and is removed from the manifest.
+    """
+    if not os.path.exists(manifest_path):
+        return []
+    with open(manifest_path, "rb+") as manifest:
+        content = manifest.read()
+        complete = content[: content.rfind(b"\n") + 1]
+        if len(complete) < len(content):
+            manifest.truncate(len(complete))
+            manifest.flush()
+            os.fsync(manifest.fileno())
+
+    entries = []
+    for line in complete.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        file_path, separator, output_size = line.rpartition("\t")
+        if not separator:
+            file_path, output_size = output_size, ""
+        entries.append((file_path, int(output_size) if output_size else None))
+    return entries
+
+
+def truncate_to_manifest(output_path, manifest_path, entries):
+    """
+    Cut the combined CSV back to the size recorded for its last finished transcript.
+
+    Rows appended after that size belong to a transcript whose manifest entry was never
+    written, because the run stopped while or right after appending them; that
+    transcript is analysed again, so its rows must not stay in the output twice.
+    """
+    if not (os.path.exists(manifest_path) and os.path.exists(output_path)):
+        return
+    if entries and entries[-1][1] is None:
+        # Written before sizes were recorded, so there is nothing to truncate to
+        return
+    output_size = entries[-1][1] if entries else 0
+    if os.path.getsize(output_path) > output_size:
+        logging.warning(
+            f"Removing {os.path.getsize(output_path) - output_size} bytes of unfinished rows from {output_path}"
+        )
+        with open(output_path, "rb+") as output_file:
+            output_file.truncate(output_size)
+            os.fsync(output_file.fileno())
+
+
+def parquet_file_name(file_path):
+    """Stable file name of a transcript's rows, so a resumed run overwrites instead of duplicating them."""
+    return f"part-{hashlib.sha1(file_path.encode('utf-8')).hexdigest()[:16]}.parquet"
+
+
+def init_worker(metrics_enabled=False, sentiment_backend=SENTIMENT_BACKEND, intra_op_threads=None):
+    """
+    Load the analysis models once per worker process, before any transcript is handled.
+
+    `intra_op_threads` is the thread count of this worker's models, for both the
+    PyTorch and the ONNX Runtime backends, so that the workers together use each
+    core once.
+    """
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(processName)s - %(message)s", level=logging.INFO
+    )
+    if metrics_enabled:
+        metrics.enable()
+    if intra_op_threads:
+        try:
+            import torch
+
+            torch.set_num_threads(intra_op_threads)
+        except ImportError:
+            pass
+    set_sentiment_backend(sentiment_backend, intra_op_threads)
+    load_analysis_models()
+
+
+def analyse_transcript(
+    file_path,
+    part_path,
+    chunk_size,
+    sentiment_cache_path=None,
+    speakers=None,
+    sentiment_mode=None,
+    output_format="csv",
+    partition_by=PARTITION_BY,
+    type_policy=None,
+):
+    """
+    Analyse one transcript in a worker process and write its rows to a part file.
+
+    The rows are tagged with the transcript path and streamed to `part_path` chunk by
+    chunk, without a header, so that the parent can append the file to the combined
+    output as is. With the parquet `output_format`, `part_path` is a directory holding
+    the transcript's partition file, ready to be moved into the dataset. With
+    `sentiment_cache_path`, the worker shares the on-disk sentiment cache with the
+    other workers.
+
+    Returns:
+    - tuple: The transcript path, the part file path, the number of rows written and
+      the stage metrics recorded for this transcript (None when metrics are disabled).
+    """
+    sentiment_cache = (
+        open_sentiment_cache(sentiment_cache_path) if sentiment_cache_path else None
+    )
+
+    chunks = iter_questions_and_answers(
+        iter_conversation_lines(file_path),
+        chunk_size=chunk_size,
+        sentiment_cache=sentiment_cache,
+        speakers=speakers,
+        sentiment_mode=sentiment_mode,
+        type_policy=type_policy,
+    )
+    rows_written = 0
+    if output_format == "parquet":
+        rows_written = write_questions_and_answers_parquet(
+            chunks, part_path, file_path, partition_by, file_name=parquet_file_name(file_path)
+        )
+    else:
+        with open(part_path, "w", encoding="utf-8", newline="") as part_file:
+            for chunk in chunks:
+                chunk_df = pd.DataFrame(chunk, columns=OUTPUT_COLUMNS)
+                chunk_df.insert(0, SOURCE_COLUMN, file_path)
+                chunk_df.to_csv(part_file, index=False, header=False)
+                rows_written += len(chunk_df)
+
+    if sentiment_cache is not None:
+        logging.info(f"Sentiment cache for {file_path}: {sentiment_cache.stats()}")
+        sentiment_cache.close()
+
+    for model, stats in padding_stats.items():
+        if stats.sentences:
+            logging.info(f"Sentiment padding of {model} for {file_path}: {stats.summary()}")
+        stats.reset()
+    if cascade_report.sentences:
+        logging.info(f"Sentiment cascade for {file_path}: {cascade_report.summary()}")
+    cascade_report.reset()
+
+    file_metrics = None
+    if metrics.enabled:
+        file_metrics = metrics.snapshot()
+        metrics.reset()
+    return file_path, part_path, rows_written, file_metrics
+
+
+def append_part(part_path, output_path):
+    """Append a finished part file to the combined output, make it durable and return the output size."""
+    write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+    with open(output_path, "a", encoding="utf-8", newline="") as output_file:
+        if write_header:
+            pd.DataFrame(columns=[SOURCE_COLUMN] + OUTPUT_COLUMNS).to_csv(
+                output_file, index=False
+            )
+        with open(part_path, "r", encoding="utf-8", newline="") as part_file:
+            shutil.copyfileobj(part_file, output_file)
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        return output_file.tell()
+
+
+def publish_parquet_part(part_path, output_path):
+    """Move the partition files of a finished transcript into the Parquet dataset."""
+    for directory, _, file_names in os.walk(part_path):
+        for file_name in file_names:
+            source = os.path.join(directory, file_name)
+            destination = os.path.join(output_path, os.path.relpath(source, part_path))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(source, destination)
+    shutil.rmtree(part_path)
+
+
+def run_batch(
+    transcripts,
+    output_path,
+    workers,
+    chunk_size=ANALYSIS_CHUNK_SIZE,
+    sentiment_cache_path=None,
+    speakers=None,
+    metrics_output=None,
+    sentiment_mode=None,
+    sentiment_backend=SENTIMENT_BACKEND,
+    output_format="csv",
+    partition_by=PARTITION_BY,
+    type_policy=None,
+):
+    """
+    Analyse transcripts over a process pool into one combined CSV file or Parquet dataset.
+
+    With the parquet `output_format`, `output_path` is a dataset directory partitioned
+    by `partition_by` (the transcript path or the analysis date), with one compressed
+    file per transcript in its partition.
+
+    With `metrics_output`, per-stage metrics of every worker are merged and exported
+    at the end of the run (Prometheus text for a .prom path, JSON otherwise).
+
+    A transcript is recorded in the `<output>.done` manifest, together with the size of
+    the combined CSV, only after its rows have been appended and synced to disk, and the
+    manifest is synced too. A crashed run can be restarted: it truncates the CSV to the
+    last recorded size, dropping the rows of a transcript that was not recorded, and
+    skips the transcripts that were already completed.
+
+    Returns:
+    - int: The number of transcripts analysed by this run.
+    """
+    manifest_path = f"{output_path}.done"
+    parts_directory = f"{output_path}.parts"
+    os.makedirs(parts_directory, exist_ok=True)
+
+    entries = read_done_manifest(manifest_path)
+    if output_format != "parquet":
+        truncate_to_manifest(output_path, manifest_path, entries)
+    done = {file_path for file_path, _ in entries}
+    pending = [path for path in transcripts if path not in done]
+    logging.info(f"{len(done)} transcripts already done, {len(pending)} to analyse")
+
+    # Parquet parts are directories holding the transcript's partition file
+    part_suffix = "" if output_format == "parquet" else ".csv"
+    completed = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(
+            metrics_output is not None,
+            sentiment_backend,
+            max(1, default_intra_op_threads() // workers),
+        ),
+    ) as executor:
+        futures = {
+            executor.submit(
+                analyse_transcript,
+                path,
+                os.path.join(parts_directory, f"{index}{part_suffix}"),
+                chunk_size,
+                sentiment_cache_path,
+                speakers,
+                sentiment_mode,
+                output_format,
+                partition_by,
+                type_policy,
+            ): path
+            for index, path in enumerate(pending)
+        }
+        with open(manifest_path, "a", encoding="utf-8") as manifest:
+            for future in as_completed(futures):
+                try:
+                    file_path, part_path, rows_written, file_metrics = future.result()
+                except Exception:
+                    logging.exception(f"Failed to analyse {futures[future]}")
+                    continue
+
+                if output_format == "parquet":
+                    # Stable file names: publishing a transcript again overwrites its rows
+                    publish_parquet_part(part_path, output_path)
+                    manifest.write(f"{file_path}\t\n")
+                else:
+                    output_size = append_part(part_path, output_path)
+                    os.remove(part_path)
+                    manifest.write(f"{file_path}\t{output_size}\n")
+                manifest.flush()
+                os.fsync(manifest.fileno())
+                if file_metrics is not None:
+                    metrics.merge(file_metrics)
+
+                completed += 1
+                logging.info(
+                    f"[{completed}/{len(pending)}] {file_path}: {rows_written} rows"
+                )
+
+    shutil.rmtree(parts_directory, ignore_errors=True)
+    if metrics_output is not None:
+        metrics.export(metrics_output)
+        logging.info(f"Stage metrics written to {metrics_output}")
+    return completed
+
+
+@click.command()
+@click.argument("inputs", nargs=-1, required=True)
+@click.option(
+    "--output",
+    default=None,
+    help="Combined CSV file or Parquet dataset directory; <output>.done tracks finished transcripts "
+    "(Default is processed_chat_data.csv, or processed_chat_data for Parquet)",
+)
+@click.option(
+    "--pattern",
+    default="*.txt",
+    help="File pattern used inside input directories (Default is *.txt)",
+)
+@click.option(
+    "--workers",
+    default=os.cpu_count() or 1,
+    type=int,
+    help="Number of worker processes, each with its own copy of the models (Default is the CPU count)",
+)
+@click.option(
+    "--chunk_size",
+    default=ANALYSIS_CHUNK_SIZE,
+    type=int,
+    help=f"Sentences analysed together per chunk (Default is {ANALYSIS_CHUNK_SIZE})",
+)
+@click.option(
+    "--sentiment_cache",
+    default=None,
+    help="SQLite file caching sentiment results across sentences and runs (Default is no cache)",
+)
+@click.option(
+    "--speakers",
+    default=None,
+    help="Comma-separated speaker labels to recognise (Default is Entrevistador,Pessoa)",
+)
+@click.option(
+    "--metrics_output",
+    default=None,
+    help="Export per-stage call counts and latency histograms here; .prom for Prometheus, JSON otherwise",
+)
+@click.option(
+    "--sentiment_mode",
+    default=SENTIMENT_MODE,
+    type=click.Choice(SENTIMENT_MODES),
+    help=f"Sentiment models to run; cascade runs XLM-RoBERTa only on low-confidence sentences (Default is {SENTIMENT_MODE})",
+)
+@click.option(
+    "--sentiment_backend",
+    default=SENTIMENT_BACKEND,
+    type=click.Choice(SENTIMENT_BACKENDS),
+    help=f"How the sentiment models are served on CPU (Default is {SENTIMENT_BACKEND})",
+)
+@click.option(
+    "--output_format",
+    default="csv",
+    type=click.Choice(OUTPUT_FORMATS),
+    help="Write one CSV file or a compressed, partitioned Parquet dataset (Default is csv)",
+)
+@click.option(
+    "--partition_by",
+    default=PARTITION_BY,
+    type=click.Choice(PARTITION_COLUMNS),
+    help=f"Partition column of the Parquet dataset (Default is {PARTITION_BY})",
+)
+@click.option(
+    "--skip_nlp",
+    default="",
+    help="Comma-separated sentence types that skip spaCy and subject/object extraction, "
+    f"out of {','.join(SENTENCE_TYPE_POLICY)} (Default is Command only)",
+)
+@click.option(
+    "--skip_sentiment",
+    default="",
+    help="Comma-separated sentence types whose sentiment is not computed (Default is none)",
+)
+def main(
+    inputs,
+    output,
+    pattern,
+    workers,
+    chunk_size,
+    sentiment_cache,
+    speakers,
+    metrics_output,
+    sentiment_mode,
+    sentiment_backend,
+    output_format,
+    partition_by,
+    skip_nlp,
+    skip_sentiment,
+):
+    """
+    Analyses a directory or glob of conversation transcripts in parallel.
+
+    INPUTS are directories, glob patterns or files. Re-running the same command after a
+    crash resumes where it stopped, skipping transcripts that are already in the output.
+    """
+    skip_nlp = skip_nlp.split(",") if skip_nlp else []
+    skip_sentiment = skip_sentiment.split(",") if skip_sentiment else []
+    for sentence_type in skip_nlp + skip_sentiment:
+        if sentence_type not in SENTENCE_TYPE_POLICY:
+            raise click.BadParameter(f"Unknown sentence type '{sentence_type}'")
+
+    if output is None:
+        output = "processed_chat_data" if output_format == "parquet" else "processed_chat_data.csv"
+    transcripts = find_transcripts(inputs, pattern=pattern)
+    logging.info(f"Found {len(transcripts)} transcripts")
+
+    completed = run_batch(
+        transcripts,
+        output,
+        workers,
+        chunk_size=chunk_size,
+        sentiment_cache_path=sentiment_cache,
+        speakers=speakers.split(",") if speakers else None,
+        metrics_output=metrics_output,
+        sentiment_mode=sentiment_mode,
+        sentiment_backend=sentiment_backend,
+        output_format=output_format,
+        partition_by=partition_by,
+        type_policy=sentence_type_policy(skip_nlp=skip_nlp, skip_sentiment=skip_sentiment),
+    )
+    logging.info(f"Analysed {completed} transcripts into {output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
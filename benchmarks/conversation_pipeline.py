@@ -0,0 +1,541 @@
+"""
+Benchmark suite for the conversation analysis pipeline.
+
+Generates a synthetic Portuguese transcript seeded from sample_chat.txt and measures
+each stage of find_questions_and_answers on it: line extraction, spaCy parse,
+classify_sentence, subject/object extraction and each sentiment model, plus the
+end-to-end pipeline with the padding efficiency of its sentiment batches, and the
+memory per row of its results. The transcript is written to disk and streamed: line
+extraction and the end-to-end pipeline cover all of it, while the stages in between run on
+a bounded sample of its sentences (--sample_size), so no stage retains the whole run.
+Results are written as JSON so runs can be compared across versions.
+
+Run from the repository root:
+
+    python -m benchmarks.conversation_pipeline --lines 100000 --output bench.json
+    python -m benchmarks.conversation_pipeline --stub_models --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import logging
+import platform
+import subprocess
+import statistics
+from itertools import islice
+
+import click
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import conversation_analysis as ca
+from modules.length_batching import LengthBucketedClassifier
+from modules.model_registry import registry
+from modules.staged_pipeline import EXECUTORS
+from modules.resources import PeakRssTracker, current_rss_bytes, peak_rss_bytes
+
+# Sentences the stages between line extraction and the end-to-end runs are measured on.
+# Their rates do not need the whole transcript, and the Docs of a long one would
+# dominate memory
+BENCHMARK_SAMPLE_SIZE = 20_000
+
+SEED_TRANSCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "sample_chat.txt"
+)
+
+# Replacement values used to vary the seeded sentences
+NAMES = ["Ana Silva", "João Souza", "Maria Oliveira", "Pedro Santos", "Carla Lima"]
+PLACES = ["Avenida Paulista", "Rua Augusta", "Praça da Sé", "Avenida Brasil"]
+SERVICES = ["manutenção de semáforos", "coleta de lixo", "iluminação pública"]
+
+
+def generate_transcript(n_lines, seed_path=SEED_TRANSCRIPT, seed=0):
+    """
+    Lazily generate a synthetic transcript of `n_lines` lines seeded from a real one.
+
+    Sentences of the seed transcript are drawn per speaker, with names, places,
+    services and numbers swapped, and blank lines are interleaved as in real exports.
+    Lines are yielded one at a time, so millions of lines can be produced with flat
+    memory use.
+    """
+    conversation = ca.extract_actors_and_sentences(ca.read_conversation_file(seed_path))
+    by_actor = {
+        actor: group["sentence"].tolist() for actor, group in conversation.groupby("actor")
+    }
+    speakers = [actor for actor in ca.SPEAKERS if actor in by_actor]
+    rng = random.Random(seed)
+
+    def vary(sentence):
+        for pool in (NAMES, PLACES, SERVICES):
+            for value in pool:
+                if value in sentence:
+                    sentence = sentence.replace(value, rng.choice(pool))
+        return "".join(str(rng.randint(0, 9)) if char.isdigit() else char for char in sentence)
+
+    for index in range(n_lines):
+        if index % 3 == 2:
+            yield ""
+            continue
+        actor = speakers[(index - index // 3) % len(speakers)]
+        yield f"{actor}: {vary(rng.choice(by_actor[actor]))}"
+
+
+def write_transcript(path, n_lines, seed=0):
+    with open(path, "w", encoding="utf-8") as transcript:
+        for line in generate_transcript(n_lines, seed=seed):
+            transcript.write(line + "\n")
+
+
+def use_stub_models():
+    """
+    Replace every analysis model with an offline stand-in.
+
+    spaCy becomes a blank Portuguese pipeline with a trivial parser, and both sentiment
+    pipelines become a deterministic word-list classifier with the same output format.
+    Absolute numbers are then only meaningful for the non-model stages.
+    """
+    import spacy
+    from spacy.language import Language
+
+    @Language.component("stub_parser")
+    def stub_parser(doc):
+        for token in doc:
+            token.dep_ = "ROOT"
+            token.pos_ = "PUNCT" if token.is_punct else "NOUN"
+        return doc
+
+    def load_stub_nlp():
+        nlp = spacy.blank("pt")
+        nlp.add_pipe("stub_parser")
+        return nlp
+
+    positive_words = {"ótimo", "perfeito", "obrigado", "claro", "certo"}
+    negative_words = {"demora", "congestionamentos", "urgência", "problema"}
+
+    def stub_scores(text):
+        words = set(text.lower().split())
+        positive = len(words & positive_words)
+        negative = len(words & negative_words)
+        total = positive + negative + 1
+        return [
+            {"label": "positive", "score": positive / total},
+            {"label": "neutral", "score": 1 / total},
+            {"label": "negative", "score": negative / total},
+        ]
+
+    class StubTokenizer:
+        model_max_length = 512
+
+        def __call__(self, texts, **kwargs):
+            # Whitespace words plus the two special tokens
+            return {"input_ids": [[0] + text.split() + [0] for text in texts]}
+
+    class StubSentimentPipeline:
+        tokenizer = StubTokenizer()
+
+        def __init__(self, return_all_scores):
+            self.return_all_scores = return_all_scores
+
+        def predict(self, text):
+            scores = stub_scores(text)
+            return scores if self.return_all_scores else max(scores, key=lambda s: s["score"])
+
+        def __call__(self, inputs, **kwargs):
+            if isinstance(inputs, str):
+                return [self.predict(inputs)]
+            return [self.predict(text) for text in inputs]
+
+    registry.register("nlp", load_stub_nlp, replace=True)
+    registry.register("matcher", ca.load_matcher, replace=True)
+    registry.register(
+        "distilled_student_sentiment_classifier",
+        lambda: LengthBucketedClassifier(
+            StubSentimentPipeline(return_all_scores=True),
+            token_budget=ca.SENTIMENT_TOKEN_BUDGET,
+            stats=ca.padding_stats["distilbert"],
+        ),
+        replace=True,
+    )
+    registry.register(
+        "roberta_sentiment_classifier",
+        lambda: LengthBucketedClassifier(
+            StubSentimentPipeline(return_all_scores=False),
+            token_budget=ca.SENTIMENT_TOKEN_BUDGET,
+            stats=ca.padding_stats["roberta"],
+        ),
+        replace=True,
+    )
+
+
+def measure(name, items, function, per_item=True, count=None):
+    """
+    Run one stage and collect its timing and memory figures.
+
+    With `per_item`, `function` is called once per item and per-call latency
+    percentiles are reported; otherwise it is called once with the whole list, or with
+    a transcript path it streams, in which case `count` gives the number of items.
+    `peak_rss_mb` is the peak RSS reached during this stage only.
+
+    Returns:
+    - tuple: The stage results and a dict of metrics for the stage.
+    """
+    rss_before = current_rss_bytes()
+    latencies = []
+    with PeakRssTracker() as peak_rss:
+        start = time.perf_counter()
+        if per_item:
+            results = []
+            for item in items:
+                call_start = time.perf_counter()
+                results.append(function(item))
+                latencies.append(time.perf_counter() - call_start)
+        else:
+            results = function(items)
+        elapsed = time.perf_counter() - start
+
+    if count is None:
+        count = len(items)
+    metrics = {
+        "stage": name,
+        "items": count,
+        "seconds": elapsed,
+        "sentences_per_sec": count / elapsed if elapsed else None,
+        "mean_latency_ms": 1000 * elapsed / count if count else None,
+        "rss_delta_mb": (current_rss_bytes() - rss_before) / 2**20,
+        "peak_rss_mb": peak_rss.peak_bytes / 2**20,
+    }
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        metrics["p50_latency_ms"] = 1000 * quantiles[49]
+        metrics["p95_latency_ms"] = 1000 * quantiles[94]
+    logging.info(
+        f"{name}: {count} items in {elapsed:.2f}s ({metrics['sentences_per_sec'] or 0:.1f}/s)"
+    )
+    return results, metrics
+
+
+def deep_sizeof(rows):
+    """Size in bytes of a list of row dicts, counting each distinct object once."""
+    seen = set()
+    total = 0
+    for obj in [rows, *rows, *(value for row in rows for value in row.values())]:
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            total += sys.getsizeof(obj)
+    return total
+
+
+def measure_result_memory(rows):
+    """Compare the memory per row of the analysed rows held as dicts, as a DataFrame and columnar."""
+    results = ca.collect_questions_and_answers([rows])
+    columnar_frame = results.to_pandas()
+    count = len(rows) or 1
+    layouts = {
+        "list_of_dicts": deep_sizeof(rows),
+        "dataframe": pd.DataFrame(rows, columns=ca.OUTPUT_COLUMNS).memory_usage(deep=True).sum(),
+        "columnar_store": results.nbytes(),
+        "columnar_dataframe": columnar_frame.memory_usage(deep=True).sum(),
+    }
+    metrics = {"stage": "result_memory", "items": len(rows)}
+    for layout, size in layouts.items():
+        metrics[f"{layout}_bytes_per_row"] = int(size) / count
+    logging.info(
+        "result_memory: "
+        + ", ".join(f"{layout} {int(size) / count:.0f} B/row" for layout, size in layouts.items())
+    )
+    return metrics
+
+
+def count_extracted_sentences(transcript_path):
+    """Extract the sentences of a transcript file block by block and return how many there are."""
+    lines = ca.iter_conversation_lines(transcript_path)
+    count = 0
+    while True:
+        block = list(islice(lines, ca.EXTRACTION_BLOCK_SIZE))
+        if not block:
+            return count
+        count += len(ca.extract_actors_and_sentences(block))
+
+
+def run_benchmark(
+    transcript_path,
+    line_count,
+    batch_size,
+    nlp_batch_size,
+    stage_workers=None,
+    stage_executor=ca.STAGE_EXECUTOR,
+    sample_size=BENCHMARK_SAMPLE_SIZE,
+):
+    """Benchmark each pipeline stage on a transcript file and return the list of stage metrics.
+
+    Line extraction and the end-to-end pipelines stream the whole transcript and only
+    count their outputs. The stages in between run on its first `sample_size` sentences,
+    so no stage holds the Docs or rows of the whole transcript, and each peak RSS
+    reflects its own stage. With `stage_workers` (spaCy workers, sentiment workers),
+    the staged concurrent pipeline is also measured end to end.
+    """
+    stages = []
+
+    # Models are loaded up front so that load time does not count against any stage
+    load_start = time.perf_counter()
+    ca.load_analysis_models()
+    stages.append(
+        {
+            "stage": "model_load",
+            "seconds": time.perf_counter() - load_start,
+            "load_times": registry.load_times(),
+            "resident_mb": {
+                name: info["resident_bytes"] / 2**20
+                for name, info in registry.report().items()
+                if info["loaded"]
+            },
+            "peak_rss_mb": peak_rss_bytes() / 2**20,
+        }
+    )
+
+    _, metrics = measure(
+        "line_extraction", transcript_path, count_extracted_sentences, per_item=False, count=line_count
+    )
+    stages.append(metrics)
+
+    sentences = [
+        sentence
+        for _, sentence, _ in islice(
+            ca.iter_classified_sentences(ca.iter_conversation_lines(transcript_path)), sample_size
+        )
+    ]
+
+    nlp = ca.get_nlp()
+    docs, metrics = measure(
+        "spacy_parse",
+        sentences,
+        lambda texts: list(nlp.pipe(texts, batch_size=nlp_batch_size)),
+        per_item=False,
+    )
+    stages.append(metrics)
+
+    types, metrics = measure("classify_sentence", docs, ca.classify_sentence)
+    stages.append(metrics)
+
+    questions = [doc for doc, sentence_type in zip(docs, types) if sentence_type == "Question"]
+    statements = [doc for doc, sentence_type in zip(docs, types) if sentence_type == "Statement"]
+    _, metrics = measure("extract_subject_question", questions, ca.extract_subject_question)
+    stages.append(metrics)
+    # The parser only runs on statements, on demand
+    _, metrics = measure(
+        "spacy_parse_dependencies",
+        statements,
+        lambda docs: ca.parse_dependencies(docs, batch_size=nlp_batch_size),
+        per_item=False,
+    )
+    stages.append(metrics)
+    _, metrics = measure(
+        "extract_subject_and_object", statements, ca.extract_subject_and_object
+    )
+    stages.append(metrics)
+    del docs, questions, statements
+
+    distilbert = ca.get_distilled_student_sentiment_classifier()
+    _, metrics = measure(
+        "sentiment_distilbert",
+        sentences,
+        lambda texts: distilbert(texts, batch_size=batch_size),
+        per_item=False,
+    )
+    stages.append(metrics)
+
+    roberta = ca.get_roberta_sentiment_classifier()
+    _, metrics = measure(
+        "sentiment_roberta",
+        sentences,
+        lambda texts: roberta(texts, batch_size=batch_size),
+        per_item=False,
+    )
+    stages.append(metrics)
+
+    for stats in ca.padding_stats.values():
+        stats.reset()
+    # Rows are counted and dropped; only a sample is kept for the result memory figures
+    sample_rows = []
+
+    def end_to_end(path):
+        rows = 0
+        for chunk in ca.iter_questions_and_answers(
+            ca.iter_conversation_lines(path), batch_size=batch_size, nlp_batch_size=nlp_batch_size
+        ):
+            rows += len(chunk)
+            sample_rows.extend(chunk[: sample_size - len(sample_rows)])
+        return rows
+
+    rows, metrics = measure("end_to_end", transcript_path, end_to_end, per_item=False, count=line_count)
+    metrics["rows"] = rows
+    metrics["padding"] = {name: stats.summary() for name, stats in ca.padding_stats.items()}
+    stages.append(metrics)
+    stages.append(measure_result_memory(sample_rows))
+
+    if stage_workers:
+        nlp_workers, sentiment_workers = stage_workers
+        _, metrics = measure(
+            "end_to_end_staged",
+            transcript_path,
+            lambda path: sum(
+                len(chunk)
+                for chunk in ca.iter_questions_and_answers_staged(
+                    ca.iter_conversation_lines(path),
+                    batch_size=batch_size,
+                    nlp_batch_size=nlp_batch_size,
+                    nlp_workers=nlp_workers,
+                    sentiment_workers=sentiment_workers,
+                    executor=stage_executor,
+                )
+            ),
+            per_item=False,
+            count=line_count,
+        )
+        metrics.update(
+            {
+                "executor": stage_executor,
+                "nlp_workers": nlp_workers,
+                "sentiment_workers": sentiment_workers,
+            }
+        )
+        stages.append(metrics)
+    return stages
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(SEED_TRANSCRIPT),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(previous, current):
+    """Print the throughput change of every stage relative to a previous result file."""
+    previous_stages = {stage["stage"]: stage for stage in previous["stages"]}
+    print(f"\nCompared with {previous.get('revision')} ({previous.get('timestamp')}):")
+    for stage in current["stages"]:
+        before = previous_stages.get(stage["stage"], {}).get("sentences_per_sec")
+        after = stage.get("sentences_per_sec")
+        if before and after:
+            print(f"  {stage['stage']:<28} {before:>12.1f}/s -> {after:>12.1f}/s ({after / before - 1:+.1%})")
+
+
+@click.command()
+@click.option("--lines", default=10_000, type=int, help="Synthetic transcript length in lines (Default is 10000)")
+@click.option("--seed", default=0, type=int, help="Random seed of the synthetic transcript (Default is 0)")
+@click.option(
+    "--stub_models",
+    is_flag=True,
+    help="Use offline stand-ins for spaCy and both sentiment models (Default is False)",
+)
+@click.option(
+    "--batch_size",
+    default=ca.SENTIMENT_BATCH_SIZE,
+    type=int,
+    help=f"Sentiment batch size (Default is {ca.SENTIMENT_BATCH_SIZE})",
+)
+@click.option(
+    "--nlp_batch_size",
+    default=ca.NLP_BATCH_SIZE,
+    type=int,
+    help=f"spaCy nlp.pipe batch size (Default is {ca.NLP_BATCH_SIZE})",
+)
+@click.option(
+    "--stage_workers",
+    default=None,
+    help="Also measure the staged pipeline with these spaCy,sentiment workers, e.g. 2,2",
+)
+@click.option(
+    "--stage_executor",
+    default=ca.STAGE_EXECUTOR,
+    type=click.Choice(EXECUTORS),
+    help=f"Workers of the staged pipeline are threads or processes (Default is {ca.STAGE_EXECUTOR})",
+)
+@click.option("--output", default="benchmark_results.json", help="JSON results file (Default is benchmark_results.json)")
+@click.option("--compare", default=None, help="Previous JSON results file to compare against")
+@click.option("--save_transcript", default=None, help="Also write the synthetic transcript to this path")
+@click.option(
+    "--sample_size",
+    default=BENCHMARK_SAMPLE_SIZE,
+    type=int,
+    help=f"Sentences the spaCy, extraction and sentiment stages run on (Default is {BENCHMARK_SAMPLE_SIZE})",
+)
+def main(
+    lines,
+    seed,
+    stub_models,
+    batch_size,
+    nlp_batch_size,
+    stage_workers,
+    stage_executor,
+    output,
+    compare,
+    save_transcript,
+    sample_size,
+):
+    """
+    Benchmarks throughput, per-stage latency and peak RSS of the conversation analysis pipeline.
+    """
+    if stub_models:
+        use_stub_models()
+
+    if stage_workers:
+        stage_workers = tuple(int(workers) for workers in stage_workers.split(","))
+
+    # The stages stream the transcript from disk instead of holding it in memory
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        transcript_path = save_transcript or os.path.join(temporary_directory, "transcript.txt")
+        write_transcript(transcript_path, lines, seed=seed)
+        stages = run_benchmark(
+            transcript_path,
+            lines,
+            batch_size,
+            nlp_batch_size,
+            stage_workers=stage_workers,
+            stage_executor=stage_executor,
+            sample_size=sample_size,
+        )
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "lines": lines,
+            "seed": seed,
+            "stub_models": stub_models,
+            "batch_size": batch_size,
+            "nlp_batch_size": nlp_batch_size,
+            "stage_workers": stage_workers,
+            "stage_executor": stage_executor,
+            "sample_size": sample_size,
+        },
+        "stages": stages,
+    }
+    with open(output, "w", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2)
+    logging.info(f"Results written to {output}")
+
+    if compare:
+        with open(compare, "r", encoding="utf-8") as previous_file:
+            compare_results(json.load(previous_file), results)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
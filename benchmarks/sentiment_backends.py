@@ -0,0 +1,154 @@
+"""
+Parity check and benchmark of the sentiment backends (PyTorch, ONNX Runtime, ONNX int8).
+
+Each backend runs in its own fresh process so that load time, throughput and resident
+memory are measured in isolation. Labels of every backend are compared with the
+PyTorch labels, per model.
+
+Run from the repository root:
+
+    python -m benchmarks.sentiment_backends --lines 5000 --backends pytorch,onnx,onnx-int8
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import conversation_analysis as ca
+from benchmarks.conversation_pipeline import generate_transcript
+from modules.resources import current_rss_bytes, peak_rss_bytes
+
+CLASSIFIERS = {
+    "distilbert": "distilled_student_sentiment_classifier",
+    "roberta": "roberta_sentiment_classifier",
+}
+
+
+def run_backend(backend, sentences, batch_size, threads):
+    """Load both classifiers with one backend and label the sentences (runs in a fresh process)."""
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+    ca.set_sentiment_backend(backend)
+
+    report = {"backend": backend, "models": {}}
+    labels = {}
+    for name, registry_name in CLASSIFIERS.items():
+        rss_before = current_rss_bytes()
+        load_start = time.perf_counter()
+        classifier = ca.registry.get(registry_name)
+        load_seconds = time.perf_counter() - load_start
+        model_rss = current_rss_bytes() - rss_before
+
+        classifier(sentences[:batch_size], batch_size=batch_size)  # warm-up
+        start = time.perf_counter()
+        outputs = classifier(sentences, batch_size=batch_size)
+        seconds = time.perf_counter() - start
+
+        if name == "distilbert":
+            labels[name] = [ca.dominant_distilbert_sentiment(scores) for scores in outputs]
+        else:
+            labels[name] = [scores["label"] for scores in outputs]
+        report["models"][name] = {
+            "load_seconds": load_seconds,
+            "model_rss_mb": model_rss / 2**20,
+            "seconds": seconds,
+            "sentences_per_sec": len(sentences) / seconds,
+        }
+    report["peak_rss_mb"] = peak_rss_bytes() / 2**20
+    return report, labels
+
+
+def benchmark_backends(sentences, backends, batch_size, threads=None):
+    """Run every backend in its own process and add label agreement with the PyTorch backend."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(
+                executor.submit(run_backend, backend, sentences, batch_size, threads).result()
+            )
+
+    reference_labels = next(
+        (labels for report, labels in results if report["backend"] == "pytorch"), None
+    )
+    reports = []
+    for report, labels in results:
+        for name, model_report in report["models"].items():
+            if reference_labels is not None:
+                agreement = sum(
+                    label == reference_label
+                    for label, reference_label in zip(labels[name], reference_labels[name])
+                ) / len(sentences)
+                model_report["label_agreement_with_pytorch"] = agreement
+        reports.append(report)
+    return reports
+
+
+@click.command()
+@click.option("--transcript", default=None, help="Transcript to analyse (Default is a synthetic one)")
+@click.option("--lines", default=3_000, type=int, help="Synthetic transcript length in lines (Default is 3000)")
+@click.option("--backends", default="pytorch,onnx,onnx-int8", help="Comma-separated backends to compare")
+@click.option("--batch_size", default=ca.SENTIMENT_BATCH_SIZE, type=int, help="Sentiment batch size")
+@click.option("--threads", default=None, type=int, help="CPU threads per backend (Default is the library default)")
+@click.option("--output", default=None, help="Also write the reports to this JSON file")
+def main(transcript, lines, backends, batch_size, threads, output):
+    """
+    Reports label parity, speedup and memory of each sentiment backend against PyTorch.
+    """
+    if transcript:
+        conversation = ca.extract_actors_and_sentences(ca.read_conversation_file(transcript))
+    else:
+        conversation = ca.extract_actors_and_sentences(list(generate_transcript(lines)))
+    sentences = conversation["sentence"].tolist()
+
+    backends = backends.split(",")
+    for backend in backends:
+        if backend not in ca.SENTIMENT_BACKENDS:
+            raise click.BadParameter(f"Unknown backend '{backend}'", param_hint="--backends")
+
+    reports = benchmark_backends(sentences, backends, batch_size, threads=threads)
+
+    baseline = {
+        name: model_report
+        for report in reports
+        if report["backend"] == "pytorch"
+        for name, model_report in report["models"].items()
+    }
+    print(f"\n{len(sentences)} sentences")
+    print(f"{'backend':<11}{'model':<12}{'sent/s':>10}{'speedup':>9}{'RSS MB':>9}{'saved MB':>10}{'agreement':>11}")
+    for report in reports:
+        for name, model_report in report["models"].items():
+            reference = baseline.get(name)
+            speedup = (
+                model_report["sentences_per_sec"] / reference["sentences_per_sec"]
+                if reference
+                else None
+            )
+            saved = reference["model_rss_mb"] - model_report["model_rss_mb"] if reference else None
+            agreement = model_report.get("label_agreement_with_pytorch")
+            print(
+                f"{report['backend']:<11}{name:<12}{model_report['sentences_per_sec']:>10.1f}"
+                f"{format(speedup, '.2f') + 'x' if speedup else '-':>9}"
+                f"{model_report['model_rss_mb']:>9.0f}"
+                f"{format(saved, '.0f') if saved is not None else '-':>10}"
+                f"{format(agreement, '.2%') if agreement is not None else '-':>11}"
+            )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as output_file:
+            json.dump(reports, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
@@ -0,0 +1,117 @@
+"""
+Compares the cascade sentiment mode with the full two-model run.
+
+The full run ("both" mode) is the reference. For each cascade threshold, the report
+shows how many sentences needed XLM-RoBERTa, the time spent, and how often the cascade
+label (XLM-RoBERTa when it ran, DistilBERT otherwise) matches the XLM-RoBERTa label of
+the full run.
+
+Run from the repository root:
+
+    python -m benchmarks.sentiment_cascade --transcript sample_chat.txt --thresholds 0.6,0.8,0.9
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import conversation_analysis as ca
+from benchmarks.conversation_pipeline import generate_transcript, use_stub_models
+
+
+def run_mode(sentences, mode, batch_size):
+    start = time.perf_counter()
+    results = ca.sentiment_analysis_batch(sentences, batch_size=batch_size, mode=mode)
+    return results, time.perf_counter() - start
+
+
+def compare_cascade(sentences, thresholds, sample_rate, batch_size):
+    """Run the full two-model reference and the cascade at each threshold, returning one report per run."""
+    reference, reference_seconds = run_mode(sentences, "both", batch_size)
+    reports = [
+        {
+            "mode": "both",
+            "seconds": reference_seconds,
+            "second_model_rate": 1.0,
+            "agreement_with_full_run": 1.0,
+            "models_agreement": sum(d == r for d, r in reference) / len(reference),
+        }
+    ]
+
+    ca.CASCADE_SAMPLE_RATE = sample_rate
+    for threshold in thresholds:
+        ca.CASCADE_THRESHOLD = threshold
+        ca.cascade_report.reset()
+        results, seconds = run_mode(sentences, "cascade", batch_size)
+        cascade_labels = [roberta or distilbert for distilbert, roberta in results]
+        agreement = sum(
+            label == roberta for label, (_, roberta) in zip(cascade_labels, reference)
+        ) / len(reference)
+        reports.append(
+            {
+                "mode": "cascade",
+                "threshold": threshold,
+                "seconds": seconds,
+                "speedup": reference_seconds / seconds if seconds else None,
+                "agreement_with_full_run": agreement,
+                **ca.cascade_report.summary(),
+            }
+        )
+    return reports
+
+
+@click.command()
+@click.option("--transcript", default=None, help="Transcript to analyse (Default is a synthetic one)")
+@click.option("--lines", default=5_000, type=int, help="Synthetic transcript length in lines (Default is 5000)")
+@click.option("--thresholds", default="0.6,0.7,0.8,0.9", help="Comma-separated cascade thresholds")
+@click.option("--sample_rate", default=ca.CASCADE_SAMPLE_RATE, type=float, help="Agreement sample rate")
+@click.option("--batch_size", default=ca.SENTIMENT_BATCH_SIZE, type=int, help="Sentiment batch size")
+@click.option("--stub_models", is_flag=True, help="Use offline stand-in models (Default is False)")
+@click.option("--output", default=None, help="Also write the reports to this JSON file")
+def main(transcript, lines, thresholds, sample_rate, batch_size, stub_models, output):
+    """
+    Reports second-model usage and label agreement of the cascade against the full two-model run.
+    """
+    if stub_models:
+        use_stub_models()
+
+    if transcript:
+        conversation = ca.extract_actors_and_sentences(ca.read_conversation_file(transcript))
+    else:
+        conversation = ca.extract_actors_and_sentences(list(generate_transcript(lines)))
+    sentences = conversation["sentence"].tolist()
+
+    reports = compare_cascade(
+        sentences,
+        [float(threshold) for threshold in thresholds.split(",")],
+        sample_rate,
+        batch_size,
+    )
+
+    print(f"\n{len(sentences)} sentences")
+    print(f"{'mode':<10}{'threshold':>10}{'2nd model':>11}{'seconds':>10}{'agreement':>11}{'sample agr.':>13}")
+    for report in reports:
+        sample_agreement = report.get("sample_agreement_rate")
+        print(
+            f"{report['mode']:<10}{report.get('threshold', '-'):>10}"
+            f"{report['second_model_rate']:>11.1%}{report['seconds']:>10.2f}"
+            f"{report['agreement_with_full_run']:>11.1%}"
+            f"{format(sample_agreement, '.1%') if sample_agreement is not None else '-':>13}"
+        )
+
+    if output:
+        with open(output, "w", encoding="utf-8") as output_file:
+            json.dump(reports, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
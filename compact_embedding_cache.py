@@ -0,0 +1,59 @@
+import logging
+
+import click
+
+from modules.constants import EMBEDDING_MODEL_NAME
+from modules.embedding_cache import EMBEDDING_CACHE_DIRECTORY, EMBEDDING_DTYPES, EmbeddingCache
+
+
+@click.command()
+@click.option(
+    "--embedding_cache",
+    default=EMBEDDING_CACHE_DIRECTORY,
+    help="Directory of the embedding cache (Default is db/embedding_cache)",
+)
+@click.option(
+    "--model_name",
+    default=EMBEDDING_MODEL_NAME,
+    help=f"Embedding model whose cache is compacted (Default is {EMBEDDING_MODEL_NAME})",
+)
+@click.option(
+    "--embedding_dtype",
+    default="float32",
+    type=click.Choice(EMBEDDING_DTYPES),
+    help="Precision of the cache to compact (Default is float32)",
+)
+@click.option(
+    "--max_age_days",
+    default=None,
+    type=float,
+    help="Also drop chunks not used for this many days (Default keeps every chunk)",
+)
+@click.option(
+    "--stats_only",
+    is_flag=True,
+    help="Only print the cache statistics (Default is False)",
+)
+def main(embedding_cache, model_name, embedding_dtype, max_age_days, stats_only):
+    """
+    Shows the statistics of an embedding cache and rewrites its vectors without unused rows.
+
+    Safe to run while ingestion processes use the cache: they switch to the compacted
+    file on their next lookup.
+    """
+    cache = EmbeddingCache(embedding_cache, model_name=model_name, dtype=embedding_dtype)
+    logging.info(f"Embedding cache {cache.directory}: {cache.stats()}")
+    if not stats_only:
+        result = cache.compact(max_age_days=max_age_days)
+        logging.info(
+            f"Dropped {result['dropped']} chunks, kept {result['entries']}: vectors went from "
+            f"{result['vector_bytes_before'] / 2**20:.1f} MB to {result['vector_bytes_after'] / 2**20:.1f} MB"
+        )
+    cache.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
@@ -1,28 +1,251 @@
+import os
 import re
-import spacy
-from spacy.matcher import Matcher
-from transformers import pipeline
+import glob
+import zlib
+from datetime import date
+from functools import partial
+from itertools import islice, tee
+
 import pandas as pd
-import streamlit as st
 
-distilled_student_sentiment_classifier = pipeline(
-    model="lxyuan/distilbert-base-multilingual-cased-sentiments-student",
-    return_all_scores=True,
+from modules.file_utils import file_sha256
+from modules.length_batching import LengthBucketedClassifier, PaddingStats
+from modules.metrics import metrics
+from modules.model_registry import registry
+from modules.parquet_output import (
+    PartitionedParquetWriter,
+    constant_column,
+    dataset_partitions,
+    is_parquet_dataset,
+    read_parquet_dataset,
+    results_schema,
 )
+from modules.result_store import ColumnarResults
+from modules.sentence_classifier import SentenceClassifier
+from modules.staged_pipeline import STAGE_QUEUE_SIZE, Stage, run_stages
+
+DISTILBERT_MODEL_ID = "lxyuan/distilbert-base-multilingual-cased-sentiments-student"
+ROBERTA_MODEL_ID = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
+SPACY_MODEL = "pt_core_news_sm"
+
+# Maximum number of sentences sent through each sentiment pipeline per forward pass
+SENTIMENT_BATCH_SIZE = 32
+
+# Sentences are batched by token length, with at most this many padded tokens
+# (batch size x longest sentence) per forward pass
+SENTIMENT_TOKEN_BUDGET = 4096
+
+# How the sentiment models are served on CPU: eager PyTorch ("pytorch"), ONNX Runtime
+# ("onnx") or ONNX Runtime with dynamic int8 quantization ("onnx-int8")
+SENTIMENT_BACKENDS = ["pytorch", "onnx", "onnx-int8"]
+SENTIMENT_BACKEND = os.environ.get("SENTIMENT_BACKEND", "pytorch")
+# ONNX Runtime threads inside each operator; None uses every physical core, so process
+# pools set cores // workers instead (see set_sentiment_backend)
+SENTIMENT_INTRA_OP_THREADS = None
+
+# Which sentiment models run on each sentence:
+# - "both": DistilBERT and XLM-RoBERTa on every sentence
+# - "cascade": DistilBERT first, XLM-RoBERTa only when DistilBERT's top score is below
+#   CASCADE_THRESHOLD, plus a CASCADE_SAMPLE_RATE sample used to measure agreement
+# - "distilbert" / "roberta": a single model
+SENTIMENT_MODES = ["both", "cascade", "distilbert", "roberta"]
+SENTIMENT_MODE = "both"
+CASCADE_THRESHOLD = 0.8
+CASCADE_SAMPLE_RATE = 0.02
+
+# Sentences analysed and written together when streaming a conversation file
+ANALYSIS_CHUNK_SIZE = 1024
+
+# Sentences handed to spaCy per nlp.pipe batch, and worker processes used to parse them.
+# With more than one process, the on-demand parser and NER passes of each chunk run
+# over the same number of processes, started again for every chunk.
+NLP_BATCH_SIZE = 256
+NLP_N_PROCESS = 1
 
-model_path = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
-roberta_sentiment_classifier = pipeline(
-    "sentiment-analysis", model=model_path, tokenizer=model_path
+# Workers of the spaCy and sentiment stages of iter_questions_and_answers_staged, and
+# whether they are threads or processes
+NLP_WORKERS = 1
+SENTIMENT_WORKERS = 1
+STAGE_EXECUTOR = "thread"
+
+# nlp.pipe only tags part-of-speech on every sentence. The parser and NER are loaded
+# disabled and run on demand (see parse_dependencies and recognise_entities); the
+# lemmatizer is never used, so it is not loaded at all.
+NLP_ON_DEMAND_COMPONENTS = ["parser", "ner"]
+NLP_EXCLUDED_COMPONENTS = ["lemmatizer"]
+
+
+# Padding efficiency of the length-bucketed sentiment batches, per model
+padding_stats = {"distilbert": PaddingStats(), "roberta": PaddingStats()}
+
+
+# Models are loaded lazily, on first use, through the process-wide registry so that
+# importing this module (e.g. only for extract_actor_and_sentence) stays cheap.
+def load_distilled_student_sentiment_classifier():
+    if SENTIMENT_BACKEND != "pytorch":
+        from modules.onnx_backend import load_onnx_pipeline
+
+        classifier = load_onnx_pipeline(
+            DISTILBERT_MODEL_ID,
+            quantize=SENTIMENT_BACKEND == "onnx-int8",
+            intra_op_threads=SENTIMENT_INTRA_OP_THREADS,
+            return_all_scores=True,
+        )
+    else:
+        from transformers import pipeline
+
+        classifier = pipeline(
+            model=DISTILBERT_MODEL_ID,
+            return_all_scores=True,
+        )
+    return LengthBucketedClassifier(
+        classifier, token_budget=SENTIMENT_TOKEN_BUDGET, stats=padding_stats["distilbert"]
+    )
+
+
+def load_roberta_sentiment_classifier():
+    if SENTIMENT_BACKEND != "pytorch":
+        from modules.onnx_backend import load_onnx_pipeline
+
+        classifier = load_onnx_pipeline(
+            ROBERTA_MODEL_ID,
+            task="sentiment-analysis",
+            quantize=SENTIMENT_BACKEND == "onnx-int8",
+            intra_op_threads=SENTIMENT_INTRA_OP_THREADS,
+        )
+    else:
+        from transformers import pipeline
+
+        classifier = pipeline(
+            "sentiment-analysis", model=ROBERTA_MODEL_ID, tokenizer=ROBERTA_MODEL_ID
+        )
+    return LengthBucketedClassifier(
+        classifier, token_budget=SENTIMENT_TOKEN_BUDGET, stats=padding_stats["roberta"]
+    )
+
+
+def load_nlp():
+    import spacy
+
+    # Load the Portuguese language model
+    return spacy.load(
+        SPACY_MODEL, exclude=NLP_EXCLUDED_COMPONENTS, disable=NLP_ON_DEMAND_COMPONENTS
+    )
+
+
+def load_matcher():
+    from spacy.matcher import Matcher
+
+    # Initialize Matcher with the current NLP vocab
+    matcher = Matcher(get_nlp().vocab)
+
+    # Define pattern for emails and a general pattern for phone numbers
+    matcher.add("EMAIL", [[{"LIKE_EMAIL": True}]])
+    return matcher
+
+
+registry.register(
+    "distilled_student_sentiment_classifier",
+    load_distilled_student_sentiment_classifier,
 )
+registry.register("roberta_sentiment_classifier", load_roberta_sentiment_classifier)
+# The matcher shares the nlp vocab, so neither is unloaded to fit the model memory budget
+registry.register("nlp", load_nlp, pinned=True)
+registry.register("matcher", load_matcher, pinned=True)
+
+ANALYSIS_MODELS = [
+    "distilled_student_sentiment_classifier",
+    "roberta_sentiment_classifier",
+    "nlp",
+    "matcher",
+]
+
+
+def get_distilled_student_sentiment_classifier():
+    return registry.get("distilled_student_sentiment_classifier")
+
+
+def get_roberta_sentiment_classifier():
+    return registry.get("roberta_sentiment_classifier")
+
+
+def get_nlp():
+    return registry.get("nlp")
+
 
-# Load the Portuguese language model
-nlp = spacy.load("pt_core_news_sm")
+def get_matcher():
+    return registry.get("matcher")
 
-# Initialize Matcher with the current NLP vocab
-matcher = Matcher(nlp.vocab)
 
-# Define pattern for emails and a general pattern for phone numbers
-matcher.add("EMAIL", [[{"LIKE_EMAIL": True}]])
+def set_sentiment_backend(backend, intra_op_threads=None):
+    """Selects the sentiment backend and its ONNX Runtime threads per operator (None for
+    every physical core); already loaded classifiers are reloaded on next use."""
+    global SENTIMENT_BACKEND, SENTIMENT_INTRA_OP_THREADS
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(
+            f"Unknown sentiment backend '{backend}', expected one of {SENTIMENT_BACKENDS}"
+        )
+    if backend != SENTIMENT_BACKEND or intra_op_threads != SENTIMENT_INTRA_OP_THREADS:
+        SENTIMENT_BACKEND = backend
+        SENTIMENT_INTRA_OP_THREADS = intra_op_threads
+        registry.unload("distilled_student_sentiment_classifier")
+        registry.unload("roberta_sentiment_classifier")
+
+
+def sentiment_models(mode=None):
+    """Returns the registry names of the sentiment classifiers a sentiment mode runs."""
+    mode = mode or SENTIMENT_MODE
+    if mode == "distilbert":
+        return ["distilled_student_sentiment_classifier"]
+    if mode == "roberta":
+        return ["roberta_sentiment_classifier"]
+    return ["distilled_student_sentiment_classifier", "roberta_sentiment_classifier"]
+
+
+def load_analysis_models():
+    """Loads every analysis model up front and returns their load times in seconds."""
+    for name in ANALYSIS_MODELS:
+        registry.get(name)
+    return registry.load_times()
+
+
+def __getattr__(name):
+    # Keeps `conversation_analysis.nlp` and friends working as lazily loaded attributes
+    if name in ANALYSIS_MODELS:
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Speaker labels recognised at the start of a line, e.g. "Pessoa: ..."
+SPEAKERS = ["Entrevistador", "Pessoa"]
+
+# Lines split into (actor, sentence) columns together by the bulk extractor
+EXTRACTION_BLOCK_SIZE = 10_000
+
+# Columns of each analysed row, in output order
+OUTPUT_COLUMNS = [
+    "sentence",
+    "actor",
+    "type",
+    "subject",
+    "object_",
+    "sentiment_roberta_result",
+    "sentiment_distilbert_result",
+]
+
+# Low-cardinality output columns stored as categorical codes by ColumnarResults
+CATEGORICAL_COLUMNS = [
+    "actor",
+    "type",
+    "sentiment_roberta_result",
+    "sentiment_distilbert_result",
+]
+
+# Output written as one CSV file, or as a Parquet dataset partitioned by PARTITION_BY
+OUTPUT_FORMATS = ["csv", "parquet"]
+OUTPUT_FORMAT = os.environ.get("CONVERSATION_OUTPUT_FORMAT", "csv")
+PARTITION_COLUMNS = ["source_file", "analysis_date"]
+PARTITION_BY = "source_file"
 
 # List of common interrogative words in Portuguese
 interrogative_words = [
@@ -47,6 +270,31 @@ command_verbs = [
     "fale",
 ]
 
+# Question and command rules compiled once from the word lists above
+sentence_classifier = SentenceClassifier(interrogative_words, command_verbs)
+
+# Heavy steps run on each sentence type, decided from the raw text before any NLP:
+# - "nlp": spaCy and the subject/object extraction of the type
+# - "sentiment": the sentiment models (the labels are left empty otherwise)
+# Commands have no extraction step, so they never reach spaCy.
+SENTENCE_TYPE_POLICY = {
+    "Question": {"nlp": True, "sentiment": True},
+    "Statement": {"nlp": True, "sentiment": True},
+    "Command": {"nlp": False, "sentiment": True},
+}
+
+
+def sentence_type_policy(skip_nlp=(), skip_sentiment=(), base=None):
+    """Returns a copy of a sentence type policy (default SENTENCE_TYPE_POLICY) with steps switched off per type."""
+    base = base or SENTENCE_TYPE_POLICY
+    return {
+        sentence_type: {
+            "nlp": steps["nlp"] and sentence_type not in skip_nlp,
+            "sentiment": steps["sentiment"] and sentence_type not in skip_sentiment,
+        }
+        for sentence_type, steps in base.items()
+    }
+
 ignore_tokens = [
     "é",
     "são",
@@ -68,20 +316,78 @@ def read_conversation_file(file_path):
         txt = file.read()
     return txt
 
-def extract_actor_and_sentence(line):
+
+def iter_conversation_lines(file_path):
+    """Lazily yields the lines of a conversation file, one at a time."""
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            yield line
+
+def compile_speaker_pattern(speakers=SPEAKERS):
+    """Compiles the pattern matching a speaker prefix and the sentence that follows it."""
+    speakers = "|".join(re.escape(speaker) for speaker in speakers)
+    return re.compile(rf"^({speakers}):\s*(.*)")
+
+
+speaker_pattern = compile_speaker_pattern()
+
+
+@metrics.timed("line_extraction")
+def extract_actor_and_sentence(line, speakers=None):
     """Extracts the actor and the sentence from a line, identifying speaker prefixes."""
+    pattern = speaker_pattern if speakers is None else compile_speaker_pattern(speakers)
+    line = line.strip()
+
     # Identify speaker prefixes and extract the sentence
-    match = re.match(r"^(Entrevistador|Pessoa):\s*(.*)", line.strip())
+    match = pattern.match(line)
     if match:
         actor = match.group(1)  # Actor (Entrevistador or Pessoa)
         sentence = match.group(2).strip()  # The actual sentence
     else:
         actor = "Unknown"  # Fallback actor if no match
-        sentence = line.strip()  # The original line as the sentence
+        sentence = line  # The original line as the sentence
 
     return actor, sentence
 
 
+@metrics.timed("line_extraction")
+def extract_actors_and_sentences(lines, speakers=None):
+    """Splits a whole transcript into actor and sentence columns in one vectorized step.
+
+    `lines` is either the transcript text or a list of its lines. Lines that leave an
+    empty sentence are dropped, so nothing downstream sees them.
+    """
+    pattern = speaker_pattern if speakers is None else compile_speaker_pattern(speakers)
+    if isinstance(lines, str):
+        lines = lines.split("\n")
+
+    stripped_lines = pd.Series(lines, dtype=object).str.strip()
+    parts = stripped_lines.str.extract(pattern.pattern)
+    conversation = pd.DataFrame(
+        {
+            "actor": parts[0].fillna("Unknown"),
+            "sentence": parts[1].str.strip().fillna(stripped_lines),
+        }
+    )
+    return conversation[conversation["sentence"] != ""].reset_index(drop=True)
+
+
+def iter_classified_sentences(lines, speakers=None, block_size=EXTRACTION_BLOCK_SIZE):
+    """Lazily yields (actor, sentence, type) triples, extracting and classifying blocks of `block_size` lines at once."""
+    lines = iter(lines)
+    while True:
+        block = list(islice(lines, block_size))
+        if not block:
+            return
+        conversation = extract_actors_and_sentences(block, speakers=speakers)
+        yield from zip(
+            conversation["actor"],
+            conversation["sentence"],
+            classify_sentences(conversation["sentence"]),
+        )
+
+
+@metrics.timed("find_phone_numbers")
 def find_phone_numbers(text):
     # Define a regex pattern for phone numbers
     # This pattern aims to match phone numbers in the formats you described
@@ -90,26 +396,280 @@ def find_phone_numbers(text):
     return matches
 
 
-def sentiment_analysis(sentence):
-    # DistilBERT analysis
-    distilbert_scores = distilled_student_sentiment_classifier(sentence)[0]
+def dominant_distilbert_sentiment(distilbert_scores):
+    """Returns the label with the highest score from the DistilBERT student output."""
     distilbert_sentiment_map = {
         item["label"]: item["score"] for item in distilbert_scores
     }
-    distilbert_dominant_sentiment = max(
-        distilbert_sentiment_map, key=distilbert_sentiment_map.get
-    )
+    return max(distilbert_sentiment_map, key=distilbert_sentiment_map.get)
+
+
+def sentiment_analysis(sentence):
+    # DistilBERT analysis
+    distilbert_scores = get_distilled_student_sentiment_classifier()(sentence)[0]
+    distilbert_dominant_sentiment = dominant_distilbert_sentiment(distilbert_scores)
 
     # Roberta analysis
-    roberta_scores = roberta_sentiment_classifier(sentence)[0]
+    roberta_scores = get_roberta_sentiment_classifier()(sentence)[0]
     roberta_dominant_sentiment = roberta_scores["label"]
 
     return distilbert_dominant_sentiment, roberta_dominant_sentiment
 
 
+def open_sentiment_cache(path, max_entries=1_000_000):
+    """Opens the on-disk sentiment cache for the configured pair of sentiment models."""
+    from modules.sentiment_cache import SentimentCache
+
+    model_ids = (DISTILBERT_MODEL_ID, ROBERTA_MODEL_ID)
+    if SENTIMENT_BACKEND != "pytorch":
+        # Quantized or exported models may label differently, so they get their own entries
+        model_ids = tuple(f"{model_id}@{SENTIMENT_BACKEND}" for model_id in model_ids)
+    return SentimentCache(path, model_ids, max_entries=max_entries)
+
+
+class CascadeReport:
+    """Counts how often the cascade needed the second model, and how often both models agreed."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.sentences = 0
+        self.low_confidence = 0
+        self.second_model_runs = 0
+        self.sampled = 0
+        self.sample_agreements = 0
+
+    def summary(self):
+        return {
+            "sentences": self.sentences,
+            "second_model_runs": self.second_model_runs,
+            "second_model_rate": (
+                self.second_model_runs / self.sentences if self.sentences else 0.0
+            ),
+            "low_confidence": self.low_confidence,
+            "sampled": self.sampled,
+            # Estimates how often both models agree on the sentences the cascade skips
+            "sample_agreement_rate": (
+                self.sample_agreements / self.sampled if self.sampled else None
+            ),
+        }
+
+
+# Process-wide counters of the cascade mode
+cascade_report = CascadeReport()
+
+
+def in_cascade_sample(sentence, sample_rate):
+    """Deterministically selects about `sample_rate` of all sentences for the agreement sample."""
+    return zlib.crc32(sentence.encode("utf-8")) % 10_000 < sample_rate * 10_000
+
+
+def sentiment_analysis_batch(
+    sentences, batch_size=SENTIMENT_BATCH_SIZE, cache=None, mode=None
+):
+    """Runs the sentiment classifiers over a list of sentences in batches.
+
+    The classifiers group sentences of similar token length into batches of at most
+    `batch_size` sentences and SENTIMENT_TOKEN_BUDGET padded tokens, see
+    LengthBucketedClassifier; padding efficiency is accumulated in padding_stats.
+
+    Returns one (distilbert, roberta) tuple per sentence, in input order, with the
+    same labels that sentiment_analysis produces for each sentence on its own.
+
+    `mode` (default SENTIMENT_MODE) selects which models run, see SENTIMENT_MODES.
+    A label is None when its model did not run on the sentence.
+
+    Each distinct sentence goes through a model once. With a SentimentCache, labels
+    stored before are reused and only the ones the mode needs and the cache lacks are
+    computed and then stored; the cached DistilBERT confidence keeps the cascade
+    routing identical for cached sentences.
+    """
+    mode = mode or SENTIMENT_MODE
+    if mode not in SENTIMENT_MODES:
+        raise ValueError(f"Unknown sentiment mode '{mode}', expected one of {SENTIMENT_MODES}")
+
+    if not sentences:
+        return []
+
+    distinct = list(dict.fromkeys(sentences))
+    distilbert_labels = {}
+    distilbert_confidences = {}
+    roberta_labels = {}
+    if cache is not None:
+        with metrics.stage("sentiment_cache", items=len(sentences)):
+            cached = cache.get_many(sentences)
+        for sentence, (distilbert, confidence, roberta) in cached.items():
+            if distilbert is not None:
+                distilbert_labels[sentence] = distilbert
+                distilbert_confidences[sentence] = confidence
+            if roberta is not None:
+                roberta_labels[sentence] = roberta
+    computed = set()
+
+    # DistilBERT analysis, one list of label scores per sentence
+    if mode != "roberta":
+        missing = [sentence for sentence in distinct if sentence not in distilbert_labels]
+        if missing:
+            with metrics.stage("sentiment_distilbert", items=len(missing)):
+                distilbert_outputs = get_distilled_student_sentiment_classifier()(
+                    missing, batch_size=batch_size
+                )
+            for sentence, distilbert_scores in zip(missing, distilbert_outputs):
+                distilbert_labels[sentence] = dominant_distilbert_sentiment(distilbert_scores)
+                distilbert_confidences[sentence] = max(item["score"] for item in distilbert_scores)
+            computed.update(missing)
+
+    if mode in ["both", "roberta"]:
+        roberta_sentences = set(distinct)
+    elif mode == "cascade":
+        low_confidence = {
+            sentence
+            for sentence in distinct
+            if distilbert_confidences[sentence] < CASCADE_THRESHOLD
+        }
+        sampled = {
+            sentence
+            for sentence in distinct
+            if sentence not in low_confidence
+            and in_cascade_sample(sentence, CASCADE_SAMPLE_RATE)
+        }
+        roberta_sentences = low_confidence | sampled
+    else:
+        roberta_sentences = set()
+
+    # Roberta analysis, one top label per sentence
+    missing = [
+        sentence
+        for sentence in distinct
+        if sentence in roberta_sentences and sentence not in roberta_labels
+    ]
+    if missing:
+        with metrics.stage("sentiment_roberta", items=len(missing)):
+            roberta_outputs = get_roberta_sentiment_classifier()(
+                missing, batch_size=batch_size
+            )
+        for sentence, roberta_scores in zip(missing, roberta_outputs):
+            roberta_labels[sentence] = roberta_scores["label"]
+        computed.update(missing)
+
+    if cache is not None and computed:
+        with metrics.stage("sentiment_cache", items=len(computed)):
+            cache.put_many(
+                (
+                    sentence,
+                    (
+                        distilbert_labels.get(sentence),
+                        distilbert_confidences.get(sentence),
+                        roberta_labels.get(sentence),
+                    ),
+                )
+                for sentence in distinct
+                if sentence in computed
+            )
+
+    # Only the labels of the models this mode runs, even if the cache holds more
+    distilbert_results = [
+        distilbert_labels[sentence] if mode != "roberta" else None for sentence in sentences
+    ]
+    roberta_results = [
+        roberta_labels[sentence] if sentence in roberta_sentences else None
+        for sentence in sentences
+    ]
+
+    if mode == "cascade":
+        cascade_report.sentences += len(sentences)
+        cascade_report.low_confidence += sum(sentence in low_confidence for sentence in sentences)
+        cascade_report.second_model_runs += sum(
+            sentence in roberta_sentences for sentence in sentences
+        )
+        cascade_report.sampled += sum(sentence in sampled for sentence in sentences)
+        cascade_report.sample_agreements += sum(
+            distilbert_labels[sentence] == roberta_labels[sentence]
+            for sentence in sentences
+            if sentence in sampled
+        )
+
+    return list(zip(distilbert_results, roberta_results))
+
+
+def add_sentiment(
+    questions_answers, batch_size=SENTIMENT_BATCH_SIZE, cache=None, mode=None
+):
+    """Fills the sentiment columns of already analysed rows with one batched pass."""
+    results = sentiment_analysis_batch(
+        [qa["sentence"] for qa in questions_answers],
+        batch_size=batch_size,
+        cache=cache,
+        mode=mode,
+    )
+    for qa, (distilbert_result, roberta_result) in zip(questions_answers, results):
+        qa["sentiment_roberta_result"] = roberta_result
+        qa["sentiment_distilbert_result"] = distilbert_result
+    return questions_answers
+
+
+def as_doc(sentence):
+    """Returns the sentence as a spaCy Doc, parsing it only if a raw string was given."""
+    from spacy.tokens import Doc
+
+    if isinstance(sentence, Doc):
+        return sentence
+    return get_nlp()(sentence)
+
+
+def run_on_demand_component(name, docs, annotation, stage, batch_size=NLP_BATCH_SIZE, n_process=1):
+    """Runs an on-demand spaCy component over the docs that lack `annotation` and returns all docs.
+
+    With one process the component annotates the docs in place. With more, the docs go
+    through nlp.pipe with only that component enabled, spread over `n_process` worker
+    processes like the first pass, and the annotated copies take their place in the
+    returned list.
+    """
+    nlp = get_nlp()
+    docs = list(docs)
+    pending = [index for index, doc in enumerate(docs) if not doc.has_annotation(annotation)]
+    if not pending or name not in nlp.component_names:
+        return docs
+    pending_docs = [docs[index] for index in pending]
+    with metrics.stage(stage, items=len(pending)):
+        if n_process == 1:
+            for _ in nlp.get_pipe(name).pipe(pending_docs, batch_size=batch_size):
+                pass
+        else:
+            # select_pipes only disables the other components; this one is loaded disabled
+            with nlp.select_pipes(enable=[name]):
+                nlp.enable_pipe(name)
+                try:
+                    annotated = list(nlp.pipe(pending_docs, batch_size=batch_size, n_process=n_process))
+                finally:
+                    nlp.disable_pipe(name)
+            for index, doc in zip(pending, annotated):
+                docs[index] = doc
+    return docs
+
+
+def parse_dependencies(docs, batch_size=NLP_BATCH_SIZE, n_process=1):
+    """Runs the on-demand dependency parser over the docs that are not parsed yet and returns the docs.
+
+    The parser reads the token vectors that nlp.pipe already stored on each doc, so
+    only the parsing itself is added. See run_on_demand_component for `n_process`.
+    """
+    return run_on_demand_component("parser", docs, "DEP", "spacy_parse_dependencies", batch_size, n_process)
+
+
+def recognise_entities(docs, batch_size=NLP_BATCH_SIZE, n_process=1):
+    """Runs the on-demand NER component over the docs that have no entity annotation yet and returns the docs."""
+    return run_on_demand_component("ner", docs, "ENT_IOB", "spacy_ner", batch_size, n_process)
+
+
+@metrics.timed("extract_subject_question")
 def extract_subject_question(sentence):
-    """Extracts the subject from a question sentence, focusing on tokens following interrogative words."""
-    doc = nlp(sentence)
+    """Extracts the subject from a question sentence, focusing on tokens following interrogative words.
+
+    Only part-of-speech tags are needed, so the sentence is never dependency parsed.
+    """
+    doc = as_doc(sentence)
     subject = ""
     found_interrogative = False
     temp_tokens = []
@@ -146,9 +706,23 @@ def filter_punct(tokens):
     ]
 
 
+@metrics.timed("extract_subject_and_object")
 def extract_subject_and_object(sentence):
-    """Extracts and returns the most relevant subject and object from a given sentence, excluding stop words, with enhancements for specific patterns."""
-    doc = nlp(sentence)
+    """Extracts and returns the most relevant subject and object from a given sentence, excluding stop words, with enhancements for specific patterns.
+
+    The sentence is dependency parsed if it was not already; NER runs only when the
+    dependencies leave the subject or the object empty.
+    """
+    (doc,) = parse_dependencies([as_doc(sentence)])
+    subject, object_ = dependency_subject_and_object(doc)
+    if needs_named_entities(subject, object_):
+        (doc,) = recognise_entities([doc])
+    return named_entity_fallback(doc, subject, object_)
+
+
+@metrics.timed("subject_object_dependencies")
+def dependency_subject_and_object(doc):
+    """First step of extract_subject_and_object: subject and object from patterns and dependencies only."""
     subject = ""
     object_ = ""
 
@@ -156,15 +730,16 @@ def extract_subject_and_object(sentence):
     stop_word_exceptions = ["local", "serviço"]
 
     # First, attempt to find phone numbers in the sentence
-    phone_numbers = find_phone_numbers(sentence)
+    phone_numbers = find_phone_numbers(doc.text)
     if phone_numbers:
         object_ = ", ".join(phone_numbers)  # Join all found phone numbers as the object
 
     # Apply matcher to the doc
-    matches = matcher(doc)
+    with metrics.stage("matcher"):
+        matches = get_matcher()(doc)
     for match_id, start, end in matches:
         span = doc[start:end]
-        if match_id == nlp.vocab.strings["EMAIL"] and not object_:
+        if match_id == doc.vocab.strings["EMAIL"] and not object_:
             object_ = span.text
 
     # Enhanced iteration through token dependencies for subject and object
@@ -182,6 +757,17 @@ def extract_subject_and_object(sentence):
                 " ".join(object_tokens) if not object_ else object_
             )  # Do not override if already set by pattern matcher
 
+    return subject, object_
+
+
+def needs_named_entities(subject, object_):
+    """True when the dependency step left a gap that the named entities may fill."""
+    return not subject or not object_
+
+
+@metrics.timed("subject_object_entities")
+def named_entity_fallback(doc, subject, object_):
+    """Last step of extract_subject_and_object: fills an empty subject or object from the entities, then the ROOT subtree."""
     # Integration of named entities for subjects and objects not captured by dependency parsing
     if not subject:
         for ent in doc.ents:
@@ -201,118 +787,527 @@ def extract_subject_and_object(sentence):
 
     return subject, object_
 
+@metrics.timed("classify_sentence")
 def classify_sentence(sent):
-    """Classifies a given sentence into categories such as Question, Statement, Command, etc."""
-    text = sent.text.strip()
-    cleaned_text = re.sub(r"\s+", " ", text).lower()
-
-    # Check if the sentence ends with a question mark
-    if cleaned_text.endswith("?"):
-        return "Question"
-    # Check if the sentence starts with an interrogative word
-    elif any(cleaned_text.startswith(word) for word in interrogative_words):
-        return "Question"
-    # Check if the sentence contains an interrogative word followed by a comma, indicating a question
-    elif any(f"{word}," in cleaned_text for word in interrogative_words):
-        return "Question"
-    # Check for command based on imperative verbs (simple heuristic)
-    elif any(cleaned_text.startswith(verb) for verb in command_verbs):
-        return "Command"
-    # Default to statement if no other conditions are met
-    else:
-        return "Statement"
+    """Classifies a given sentence into categories such as Question, Statement, Command, etc.
 
-def find_questions_and_answers(txt):
-    """Finds and analyzes sentences, classifying them, and extracting subjects when applicable."""
-    questions_answers = []
-    for line in txt.split("\n"):  # Process each line individually
-        actor, sentence = extract_actor_and_sentence(line)
-        if not sentence:  # Skip empty sentences
-            continue
+    Accepts a spaCy Doc/Span or the raw sentence text.
+    """
+    text = sent if isinstance(sent, str) else sent.text
+    return sentence_classifier.classify(text)
+
+
+@metrics.timed("classify_sentence")
+def classify_sentences(sentences):
+    """Classifies a whole pandas Series of sentences at once, with the same labels as classify_sentence."""
+    return sentence_classifier.classify_series(sentences)
+
+def iter_questions_and_answers(
+    lines,
+    chunk_size=ANALYSIS_CHUNK_SIZE,
+    batch_size=SENTIMENT_BATCH_SIZE,
+    nlp_batch_size=NLP_BATCH_SIZE,
+    n_process=NLP_N_PROCESS,
+    sentiment_cache=None,
+    speakers=None,
+    sentiment_mode=None,
+    type_policy=None,
+):
+    """Analyzes an iterable of conversation lines lazily, yielding lists of at most `chunk_size` rows.
 
-        sentence_doc = nlp(sentence)
+    Lines are consumed as they are needed, so memory stays bounded by the chunk size
+    no matter how long the conversation is. A `chunk_size` of None analyses the whole
+    conversation as a single chunk. Lines are split into actor and sentence in
+    blocks by extract_actors_and_sentences, with `speakers` overriding SPEAKERS, and
+    empty sentences are dropped before any NLP runs.
 
-        sentence_type = classify_sentence(sentence_doc)
-        
+    Sentences are classified from their raw text, in the same blocks, and routed by
+    type following `type_policy` (default SENTENCE_TYPE_POLICY): only the types with
+    "nlp" go through spaCy, and only the types with "sentiment" through the sentiment
+    models.
+
+    Those sentences are tokenized and tagged exactly once, in a single nlp.pipe pass over
+    the whole conversation (`nlp_batch_size` sentences per batch, spread over
+    `n_process` processes), and the resulting Doc is reused by the extractors. Only
+    the components a sentence type needs run on it: questions use the part-of-speech
+    tags alone, the statements of each chunk are dependency parsed together, and NER
+    runs on a statement only when its dependencies leave the subject or the object empty.
+
+    Sentiment is computed in batches: the sentences of each chunk are sent through
+    the classifiers together, `batch_size` sentences per forward pass. `sentiment_mode`
+    selects which models run (see SENTIMENT_MODES), and labels found in
+    `sentiment_cache` are not computed again.
+    """
+    type_policy = type_policy or SENTENCE_TYPE_POLICY
+    routed, to_nlp = tee(iter_classified_sentences(lines, speakers=speakers))
+    docs = get_nlp().pipe(
+        (
+            sentence
+            for _, sentence, sentence_type in to_nlp
+            if type_policy[sentence_type]["nlp"]
+        ),
+        batch_size=nlp_batch_size,
+        n_process=n_process,
+    )
+    docs = metrics.timed_iter("spacy_parse", docs)
+    # Sentences that skip spaCy keep None in place of their Doc
+    analysed = (
+        (actor, sentence, sentence_type, next(docs) if type_policy[sentence_type]["nlp"] else None)
+        for actor, sentence, sentence_type in routed
+    )
+
+    while True:
+        chunk = list(islice(analysed, chunk_size))
+        if not chunk:
+            return
+        yield add_sentiment_by_type(
+            analyse_docs(chunk, nlp_batch_size=nlp_batch_size, n_process=n_process),
+            type_policy,
+            batch_size=batch_size,
+            cache=sentiment_cache,
+            mode=sentiment_mode,
+        )
+
+
+def analyse_docs(chunk, nlp_batch_size=NLP_BATCH_SIZE, n_process=1):
+    """Builds the rows of a chunk of (actor, sentence, type, Doc or None) tuples, without sentiment.
+
+    Statements are parsed together, then NER runs together on those whose
+    dependencies left the subject or the object empty, both over `n_process`
+    processes. Sentences without a Doc skipped NLP and get an empty subject and object.
+    """
+    statements = {
+        index: sentence_doc
+        for index, (_, _, sentence_type, sentence_doc) in enumerate(chunk)
+        if sentence_type == "Statement" and sentence_doc is not None
+    }
+    statements = dict(
+        zip(
+            statements,
+            parse_dependencies(list(statements.values()), batch_size=nlp_batch_size, n_process=n_process),
+        )
+    )
+    dependency_results = {
+        index: dependency_subject_and_object(sentence_doc)
+        for index, sentence_doc in statements.items()
+    }
+    needs_entities = [index for index, result in dependency_results.items() if needs_named_entities(*result)]
+    statements.update(
+        zip(
+            needs_entities,
+            recognise_entities(
+                [statements[index] for index in needs_entities],
+                batch_size=nlp_batch_size,
+                n_process=n_process,
+            ),
+        )
+    )
+
+    rows = []
+    for index, (actor, sentence, sentence_type, sentence_doc) in enumerate(chunk):
         # For questions, focus on interrogative words and their related noun phrases
         subject = ''
         object_ = ''
-        if sentence_type == "Question":
-            subject = extract_subject_question(sentence)
-        elif sentence_type == "Statement":
-            subject, object_ = extract_subject_and_object(sentence)
-
-        # sentiment = sentiment_analysis(sentence)
-        distilbert_result, roberta_result = sentiment_analysis(sentence)
+        if sentence_type == "Question" and sentence_doc is not None:
+            subject = extract_subject_question(sentence_doc)
+        elif sentence_type == "Statement" and sentence_doc is not None:
+            subject, object_ = named_entity_fallback(statements[index], *dependency_results[index])
 
-        questions_answers.append(
+        rows.append(
             {
                 "sentence": sentence,
                 "actor": actor,
                 "type": sentence_type,
                 "subject": subject,
                 "object_": object_,
-                "sentiment_roberta_result": roberta_result,
-                "sentiment_distilbert_result": distilbert_result,
+                "sentiment_roberta_result": None,
+                "sentiment_distilbert_result": None,
             }
         )
+    return rows
+
+
+def add_sentiment_by_type(rows, type_policy=None, batch_size=SENTIMENT_BATCH_SIZE, cache=None, mode=None):
+    """Fills the sentiment columns of the rows whose type has sentiment in `type_policy`."""
+    type_policy = type_policy or SENTENCE_TYPE_POLICY
+    add_sentiment(
+        [row for row in rows if type_policy[row["type"]]["sentiment"]],
+        batch_size=batch_size,
+        cache=cache,
+        mode=mode,
+    )
+    return rows
+
+
+def nlp_stage(chunk, nlp_batch_size=NLP_BATCH_SIZE, type_policy=None):
+    """First stage of iter_questions_and_answers_staged: spaCy and extraction on a chunk of (actor, sentence, type)."""
+    type_policy = type_policy or SENTENCE_TYPE_POLICY
+    docs = iter(
+        get_nlp().pipe(
+            [
+                sentence
+                for _, sentence, sentence_type in chunk
+                if type_policy[sentence_type]["nlp"]
+            ],
+            batch_size=nlp_batch_size,
+        )
+    )
+    return analyse_docs(
+        [
+            (actor, sentence, sentence_type, next(docs) if type_policy[sentence_type]["nlp"] else None)
+            for actor, sentence, sentence_type in chunk
+        ],
+        nlp_batch_size=nlp_batch_size,
+    )
+
+
+def init_stage_worker(model_names, sentiment_backend=None):
+    """Loads the models a stage needs once per worker process."""
+    if sentiment_backend is not None:
+        set_sentiment_backend(sentiment_backend)
+    for name in model_names:
+        registry.get(name)
+
+
+def iter_questions_and_answers_staged(
+    lines,
+    chunk_size=ANALYSIS_CHUNK_SIZE,
+    batch_size=SENTIMENT_BATCH_SIZE,
+    nlp_batch_size=NLP_BATCH_SIZE,
+    sentiment_cache=None,
+    speakers=None,
+    sentiment_mode=None,
+    type_policy=None,
+    nlp_workers=NLP_WORKERS,
+    sentiment_workers=SENTIMENT_WORKERS,
+    executor=STAGE_EXECUTOR,
+    queue_size=STAGE_QUEUE_SIZE,
+):
+    """Same rows as iter_questions_and_answers, with spaCy and sentiment running concurrently.
+
+    Chunks of classified sentences go through two stages connected by bounded queues
+    (see run_stages): spaCy parsing and extraction (`nlp_workers`), then sentiment
+    (`sentiment_workers`). While the sentiment models work on one chunk, the next
+    chunks are already being parsed. Chunks come out in conversation order.
+
+    With the "process" `executor`, each worker process loads only the models of its
+    stage. A `chunk_size` of None is not supported here, since chunks are the unit
+    of work of the stages.
+    """
+    type_policy = type_policy or SENTENCE_TYPE_POLICY
+    sentences = iter_classified_sentences(lines, speakers=speakers)
+    chunks = iter(lambda: list(islice(sentences, chunk_size)), [])
+    stages = [
+        Stage(
+            "nlp",
+            partial(nlp_stage, nlp_batch_size=nlp_batch_size, type_policy=type_policy),
+            workers=nlp_workers,
+            initializer=init_stage_worker,
+            initargs=(["nlp", "matcher"],),
+        ),
+        Stage(
+            "sentiment",
+            partial(
+                add_sentiment_by_type,
+                type_policy=type_policy,
+                batch_size=batch_size,
+                cache=sentiment_cache,
+                mode=sentiment_mode,
+            ),
+            workers=sentiment_workers,
+            initializer=init_stage_worker,
+            initargs=(sentiment_models(sentiment_mode), SENTIMENT_BACKEND),
+        ),
+    ]
+    yield from run_stages(chunks, stages, executor=executor, queue_size=queue_size)
+
+
+def find_questions_and_answers(
+    txt,
+    window_size=None,
+    batch_size=SENTIMENT_BATCH_SIZE,
+    nlp_batch_size=NLP_BATCH_SIZE,
+    n_process=NLP_N_PROCESS,
+    sentiment_cache=None,
+    speakers=None,
+    sentiment_mode=None,
+    type_policy=None,
+):
+    """Finds and analyzes sentences, classifying them, and extracting subjects when applicable.
+
+    Sentiment is computed in batches: sentences are collected for the whole
+    conversation (or for each window of `window_size` sentences) and sent through
+    the classifiers that `sentiment_mode` selects together, `batch_size` sentences
+    per forward pass. `type_policy` decides which sentence types go through spaCy
+    and sentiment at all, see iter_questions_and_answers.
+    """
+    questions_answers = []
+    for chunk in iter_questions_and_answers(
+        txt.split("\n"),
+        chunk_size=window_size,
+        batch_size=batch_size,
+        nlp_batch_size=nlp_batch_size,
+        n_process=n_process,
+        sentiment_cache=sentiment_cache,
+        speakers=speakers,
+        sentiment_mode=sentiment_mode,
+        type_policy=type_policy,
+    ):
+        questions_answers.extend(chunk)
 
     return questions_answers
 
+
+def write_questions_and_answers(chunks, output_path, mode="w"):
+    """Writes chunks of analysed rows to a CSV file as they are produced.
+
+    Each chunk is appended and flushed before the next one is requested, so only one
+    chunk is held in memory. The header is written only when the file starts empty.
+    Returns the number of rows written.
+    """
+    rows_written = 0
+    with open(output_path, mode, encoding="utf-8", newline="") as output_file:
+        write_header = output_file.tell() == 0
+        for chunk in chunks:
+            pd.DataFrame(chunk, columns=OUTPUT_COLUMNS).to_csv(
+                output_file, index=False, header=write_header
+            )
+            output_file.flush()
+            write_header = False
+            rows_written += len(chunk)
+    return rows_written
+
+
+def partition_value(file_path, partition_by=PARTITION_BY):
+    """Returns the partition a transcript's rows are written to: its path or today's date."""
+    if partition_by == "analysis_date":
+        return date.today().isoformat()
+    return file_path
+
+
+def write_questions_and_answers_parquet(
+    chunks, output_path, file_path, partition_by=PARTITION_BY, file_name="part-0.parquet"
+):
+    """Writes chunks of analysed rows from `file_path` to a partitioned Parquet dataset as they are produced.
+
+    Each chunk becomes a compressed row group of
+    `<output_path>/<partition_by>=<partition>/<file_name>`, with the schema fixed by
+    results_schema, so only one chunk is held in memory. When partitioning by date,
+    the rows also carry a source_file column. Returns the number of rows written.
+    """
+    columns = list(OUTPUT_COLUMNS)
+    if partition_by != "source_file":
+        columns.append("source_file")
+    schema = results_schema(columns, CATEGORICAL_COLUMNS + ["source_file"])
+
+    rows_written = 0
+    partition = partition_value(file_path, partition_by)
+    with PartitionedParquetWriter(output_path, schema, partition_by, file_name=file_name) as writer:
+        for chunk in chunks:
+            table = collect_questions_and_answers([chunk]).to_arrow()
+            if "source_file" in columns:
+                table = table.append_column("source_file", constant_column(file_path, len(chunk)))
+            writer.write(table, partition)
+            rows_written += len(chunk)
+    return rows_written
+
+
+def analyse_conversation_file(
+    file_path,
+    output_path,
+    chunk_size=ANALYSIS_CHUNK_SIZE,
+    output_format="csv",
+    partition_by=PARTITION_BY,
+    **kwargs,
+):
+    """Streams a conversation file through the analysis and into a CSV file or Parquet dataset with flat memory use."""
+    chunks = iter_questions_and_answers(
+        iter_conversation_lines(file_path), chunk_size=chunk_size, **kwargs
+    )
+    if output_format == "parquet":
+        return write_questions_and_answers_parquet(chunks, output_path, file_path, partition_by)
+    return write_questions_and_answers(chunks, output_path)
+
+def collect_questions_and_answers(chunks):
+    """Gathers chunks of analysed rows into a ColumnarResults store, releasing each chunk's dicts as it goes."""
+    results = ColumnarResults(OUTPUT_COLUMNS, CATEGORICAL_COLUMNS)
+    for chunk in chunks:
+        results.extend(chunk)
+    return results
+
+
+def analyse_conversation_frame(file_path, chunk_size=ANALYSIS_CHUNK_SIZE, **kwargs):
+    """Analyses a conversation file chunk by chunk and returns all rows as one DataFrame.
+
+    Rows are kept in a columnar store while the file is analysed, and the DataFrame
+    wraps its buffers: actor, type and the sentiment labels are categorical columns,
+    and the free-text columns are Arrow-backed strings.
+    """
+    chunks = iter_questions_and_answers(
+        iter_conversation_lines(file_path), chunk_size=chunk_size, **kwargs
+    )
+    return collect_questions_and_answers(chunks).to_pandas()
+
+
+def list_conversation_files(location):
+    """Lists the transcripts at a file path, a directory (its *.txt files) or a glob pattern."""
+    if os.path.isdir(location):
+        location = os.path.join(location, "*.txt")
+    return sorted(path for path in glob.glob(location) if os.path.isfile(path))
+
+
+def running_in_streamlit():
+    try:
+        from streamlit.runtime import exists
+    except ImportError:
+        return False
+    return exists()
+
+
 def main():
-    file_path = "sample_chat.txt"
-    txt = read_conversation_file(file_path)
+    import streamlit as st
+
+    # Keep the models in memory across reruns and sessions of the Streamlit app
+    load_models = st.cache_resource(show_spinner="Loading models...")(
+        load_analysis_models
+    )
+
+    # Hashing is redone only when a file's size or modification time changes
+    @st.cache_data(show_spinner=False)
+    def cached_content_hash(file_path, modified_ns, size):
+        return file_sha256(file_path)
 
-    questions_answers = find_questions_and_answers(txt)
+    # Analysis results are keyed by content hash only, so unchanged files are never
+    # recomputed, even after a rename or a server restart
+    @st.cache_data(show_spinner="Analysing conversation...", persist="disk")
+    def cached_analysis(content_hash, _file_path):
+        load_models()
+        return analyse_conversation_frame(_file_path)
 
-    questions_answers_df = pd.DataFrame(questions_answers)
+    @st.cache_data(show_spinner=False)
+    def cached_results(files):
+        frames = [
+            cached_analysis(content_hash, file_path).assign(source_file=file_path)
+            for file_path, content_hash in files
+        ]
+        if not frames:
+            return pd.DataFrame(columns=OUTPUT_COLUMNS + ["source_file"])
+        # Categories differ between files, so concat falls back to objects; re-encode them
+        return pd.concat(frames, ignore_index=True).astype(
+            {column: "category" for column in CATEGORICAL_COLUMNS + ["source_file"]}
+        )
 
     st.title("Conversation Analysis")
 
-    st.write("Data Visualization:")
-    st.dataframe(questions_answers_df)
+    location = st.sidebar.text_input(
+        "Conversation file, directory, glob or processed Parquet dataset:", "sample_chat.txt"
+    )
+    if is_parquet_dataset(location):
+        # Processed output: only the selected partitions and columns are read from disk
+        partition_by, partitions = dataset_partitions(location)
+        partition_filter = st.sidebar.multiselect(f"Select {partition_by}:", partitions)
+        shown_columns = st.sidebar.multiselect(
+            "Select columns:", OUTPUT_COLUMNS + [partition_by], default=OUTPUT_COLUMNS
+        )
+        questions_answers_df = read_parquet_dataset(
+            location,
+            columns=list(dict.fromkeys(shown_columns + CATEGORICAL_COLUMNS)),
+            partitions=partition_filter or None,
+        )
+    else:
+        files = []
+        for file_path in list_conversation_files(location):
+            file_stat = os.stat(file_path)
+            files.append(
+                (
+                    file_path,
+                    cached_content_hash(file_path, file_stat.st_mtime_ns, file_stat.st_size),
+                )
+            )
+        if not files:
+            st.warning(f"No conversation files found at {location}")
+            return
 
-    # Sentiment count visualization
-    st.write("Sentiment Counts:")
-    sentiment_counts = questions_answers_df["sentiment"].value_counts()
-    st.bar_chart(sentiment_counts)
+        questions_answers_df = cached_results(tuple(files))
+        shown_columns = list(questions_answers_df.columns)
+
+        loaded_models = {name: info for name, info in registry.report().items() if info["loaded"]}
+        if loaded_models:
+            st.caption(
+                "Models loaded: "
+                + ", ".join(
+                    f"{name} {info['load_seconds']:.2f}s {info['resident_bytes'] / 2**20:.0f} MB"
+                    for name, info in loaded_models.items()
+                )
+            )
+
+        # Filters only touch the cached DataFrame, never the analysis pipeline
+        source_filter = st.sidebar.multiselect(
+            "Select files:", [file_path for file_path, _ in files]
+        )
+        if source_filter:
+            questions_answers_df = questions_answers_df[
+                questions_answers_df["source_file"].isin(source_filter)
+            ]
 
-    # Additional visualizations and analyses can be added here
-    # For example, filtering based on actor or sentiment
-    actor_filter = st.selectbox(
+    actor_filter = st.sidebar.selectbox(
         "Select actor:", ["All"] + list(questions_answers_df["actor"].unique())
     )
+    type_filter = st.sidebar.multiselect(
+        "Select sentence types:", list(questions_answers_df["type"].unique())
+    )
+
+    filtered_data = questions_answers_df
     if actor_filter != "All":
-        filtered_data = questions_answers_df[
-            questions_answers_df["actor"] == actor_filter
-        ]
-        st.dataframe(filtered_data)
-    else:
-        st.dataframe(questions_answers_df)
+        filtered_data = filtered_data[filtered_data["actor"] == actor_filter]
+    if type_filter:
+        filtered_data = filtered_data[filtered_data["type"].isin(type_filter)]
 
-if __name__ == "__main__":
+    st.write("Data Visualization:")
+    st.dataframe(filtered_data[shown_columns])
 
-    file_path = "sample_chat.txt"
-    txt = read_conversation_file(file_path)
+    # Sentiment count visualization
+    st.write("Sentiment Counts:")
+    sentiment_counts = pd.DataFrame(
+        {
+            "roberta": filtered_data["sentiment_roberta_result"].value_counts(),
+            "distilbert": filtered_data["sentiment_distilbert_result"].value_counts(),
+        }
+    ).fillna(0)
+    st.bar_chart(sentiment_counts)
 
-    questions_answers = find_questions_and_answers(txt)
+    st.write("Sentence Types:")
+    st.bar_chart(filtered_data["type"].value_counts())
 
-    # for qa in questions_answers:
-    #     print(
-    #         f"Sentence: '{qa['sentence']}'\nActor: '{qa['actor']}'\nType: '{qa['type']}'\nSubject: '{qa['subject']}'\nSentiment: '{qa['sentiment']}'\n"
-    #     )
+if __name__ == "__main__" and running_in_streamlit():
+    # streamlit run conversation_analysis.py
+    main()
 
-    # Após processar todas as linhas do chat e armazenar em questions_answers:
-    questions_answers_df = pd.DataFrame(questions_answers)
+elif __name__ == "__main__":
+
+    file_path = "sample_chat.txt"
+
+    # Após processar todas as linhas do chat, os resultados são gravados em blocos:
+    if OUTPUT_FORMAT == "parquet":
+        # CONVERSATION_OUTPUT_FORMAT=parquet: compressed Parquet partitioned by PARTITION_BY
+        output_path = "processed_chat_data"
+        rows_written = analyse_conversation_file(file_path, output_path, output_format="parquet")
+        processed = read_parquet_dataset(output_path).head(10)
+    else:
+        output_path = "processed_chat_data.csv"
+        rows_written = analyse_conversation_file(file_path, output_path)
+        processed = pd.read_csv(output_path, nrows=10)
 
     # Exemplo de visualização dos primeiros registros
-    print(questions_answers_df)
+    print(f"{rows_written} rows written to {output_path}")
+    print(processed)
 
-    questions_answers_df.to_csv(
-        "processed_chat_data.csv", index=False
-    )
+    for model, stats in padding_stats.items():
+        print(f"{model} sentiment batches: {stats.summary()}")
 
-    # main()
+    # Enabled with CONVERSATION_METRICS=1
+    if metrics.enabled:
+        metrics.export("processed_chat_metrics.prom")
 
 # Open File ✅
 # Extrair perguntas ✅
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import logging
+import click
+
+from conversation_analysis import (
+    load_analysis_models,
+    iter_questions_and_answers,
+    write_questions_and_answers,
+)
+from modules.file_utils import write_atomically
+
+# Upper bound of new bytes read and analysed per iteration, to keep memory flat on a large backlog
+MAX_READ_BYTES = 8 * 1024 * 1024
+
+
+def read_offset_state(state_path):
+    """Return the saved read position of the followed file, or an empty state."""
+    if not os.path.exists(state_path):
+        return {"offset": 0, "inode": None}
+    with open(state_path, "r", encoding="utf-8") as state_file:
+        return json.load(state_file)
+
+
+def save_offset_state(state_path, offset, inode):
+    write_atomically(state_path, json.dumps({"offset": offset, "inode": inode}))
+
+
+def read_new_lines(file_path, offset, max_bytes=MAX_READ_BYTES):
+    """
+    Read the complete lines appended to a file after `offset`.
+
+    A trailing line that is still being written (no newline yet) is left for the next
+    read.
+
+    Returns:
+    - tuple: The new lines and the offset just after the last complete line.
+    """
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        data = file.read(max_bytes)
+        # Keep reading when a single line is longer than the read size
+        while b"\n" not in data:
+            block = file.read(max_bytes)
+            if not block:
+                break
+            data += block
+
+    end = data.rfind(b"\n")
+    if end == -1:
+        return [], offset
+    complete = data[: end + 1]
+    return complete.decode("utf-8").split("\n")[:-1], offset + len(complete)
+
+
+def follow_conversation(file_path, output_path, state_path=None, poll_interval=1.0, once=False):
+    """
+    Follow a growing transcript and analyse only the lines appended since the last read.
+
+    The byte offset already analysed is stored in `state_path` (default
+    `<output>.offset`) after each batch of rows is appended to `output_path`, so a
+    restarted follower continues where it stopped. If the file is truncated or replaced,
+    it is analysed again from the start.
+
+    Parameters:
+    - file_path (str): The transcript to follow.
+    - output_path (str): CSV file the analysed rows are appended to.
+    - state_path (str): File holding the processed offset.
+    - poll_interval (float): Seconds to wait between checks for new lines.
+    - once (bool): Analyse what is new and return instead of following the file.
+
+    Returns:
+    - int: The number of rows appended.
+    """
+    state_path = state_path or f"{output_path}.offset"
+    state = read_offset_state(state_path)
+    offset = state["offset"]
+
+    load_analysis_models()
+    logging.info(f"Following {file_path} from byte {offset}")
+
+    rows_appended = 0
+    while True:
+        file_stat = os.stat(file_path)
+        if state["inode"] not in (None, file_stat.st_ino) or file_stat.st_size < offset:
+            logging.info(f"{file_path} was replaced or truncated, starting over")
+            offset = 0
+        state["inode"] = file_stat.st_ino
+
+        if file_stat.st_size > offset:
+            lines, new_offset = read_new_lines(file_path, offset)
+            if lines:
+                started = time.perf_counter()
+                written = write_questions_and_answers(
+                    iter_questions_and_answers(lines), output_path, mode="a"
+                )
+                rows_appended += written
+                logging.info(
+                    f"{written} new rows from bytes {offset}-{new_offset} "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            if new_offset != offset:
+                offset = new_offset
+                save_offset_state(state_path, offset, state["inode"])
+                # More backlog may be waiting beyond the read size
+                continue
+
+        if once:
+            return rows_appended
+        time.sleep(poll_interval)
+
+
+@click.command()
+@click.argument("file_path")
+@click.option(
+    "--output",
+    default="processed_chat_data.csv",
+    help="CSV file the analysed rows are appended to (Default is processed_chat_data.csv)",
+)
+@click.option(
+    "--state",
+    default=None,
+    help="File storing the processed byte offset (Default is <output>.offset)",
+)
+@click.option(
+    "--poll_interval",
+    default=1.0,
+    type=float,
+    help="Seconds between checks for new lines (Default is 1.0)",
+)
+@click.option(
+    "--once",
+    is_flag=True,
+    help="Analyse the lines appended since the last run and exit (Default is False)",
+)
+def main(file_path, output, state, poll_interval, once):
+    """
+    Follows a live conversation file and analyses newly appended lines as they arrive.
+    """
+    follow_conversation(
+        file_path, output, state_path=state, poll_interval=poll_interval, once=once
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
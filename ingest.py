@@ -0,0 +1,263 @@
+import os
+import time
+import logging
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import click
+import torch
+
+from modules.documents import load_document_chunks, source_files
+from modules.embedding_cache import EMBEDDING_DTYPES, CachedEmbeddings, EmbeddingCache
+from modules.faiss_store import FaissIndexStore, chunk_ids
+from modules.file_utils import file_sha256
+from modules.load_models import get_embeddings
+
+from modules.constants import (
+    CHROMA_SETTINGS,
+    INGEST_THREADS,
+    PERSIST_DIRECTORY,
+    SOURCE_DIRECTORY,
+)
+
+VECTOR_STORES = ["faiss", "chroma"]
+
+# Chunks embedded together; files are buffered until this many chunks are waiting
+EMBEDDING_BATCH_SIZE = 256
+
+# Files loading or loaded but not yet collected, per worker; bounds the chunks held in memory
+FILES_IN_FLIGHT_PER_WORKER = 2
+
+
+class FaissWriter:
+    """
+    Incremental ingestion into the persisted FAISS index used by the retrieval pipeline.
+
+    With an EmbeddingCache, chunks embedded before (by any file or run) are read from
+    the cache and only the others go through the model.
+    """
+
+    def __init__(self, embeddings, cache=None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.store = FaissIndexStore(embeddings)
+
+    def plan(self, file_paths, root):
+        """Return the files to embed and drop the chunks of changed and removed files."""
+        to_embed, to_remove = self.store.changes(file_paths, root)
+        self.store.remove(to_remove)
+        return to_embed, len(to_remove)
+
+    def write(self, files):
+        texts = [chunk.page_content for *_, chunks in files for chunk in chunks]
+        if not texts:
+            vectors = []
+        elif self.cache is not None:
+            vectors = self.cache.embed(texts, self.embeddings.embed_documents)
+        else:
+            vectors = self.embeddings.embed_documents(texts)
+        start = 0
+        for relative_path, file_path, sha256, chunks in files:
+            self.store.add(relative_path, file_path, sha256, chunks, vectors[start : start + len(chunks)])
+            start += len(chunks)
+
+    def close(self):
+        self.store.save()
+
+
+class ChromaWriter:
+    """
+    Ingestion into the Chroma collection in PERSIST_DIRECTORY.
+
+    Every file is embedded again (unchanged chunks come from the EmbeddingCache when
+    one is given); the chunks a file had before are deleted first, so a re-ingested
+    file is replaced instead of duplicated.
+    """
+
+    def __init__(self, embeddings, cache=None):
+        from langchain.vectorstores import Chroma
+
+        self.db = Chroma(
+            persist_directory=PERSIST_DIRECTORY,
+            embedding_function=CachedEmbeddings(embeddings, cache) if cache is not None else embeddings,
+            client_settings=CHROMA_SETTINGS,
+        )
+
+    def plan(self, file_paths, root):
+        return [(os.path.relpath(path, root), path, file_sha256(path)) for path in file_paths], 0
+
+    def write(self, files):
+        for _, file_path, _, _ in files:
+            previous_ids = self.db.get(where={"source": file_path})["ids"]
+            if previous_ids:
+                self.db.delete(previous_ids)
+        chunks = [chunk for *_, file_chunks in files for chunk in file_chunks]
+        if chunks:
+            # One embed_documents call for the whole batch
+            self.db.add_texts(
+                [chunk.page_content for chunk in chunks],
+                metadatas=[chunk.metadata for chunk in chunks],
+                ids=[
+                    chunk_id
+                    for relative_path, _, sha256, file_chunks in files
+                    for chunk_id in chunk_ids(relative_path, sha256, len(file_chunks))
+                ],
+            )
+
+    def close(self):
+        self.db.persist()
+
+
+def run_ingest(source_directory, writer, workers=INGEST_THREADS, embedding_batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Load, split and embed the documents of `source_directory` into a vector store.
+
+    Files are loaded and split over a process pool while the main process embeds the
+    chunks that are ready, `embedding_batch_size` chunks (or more, for a large file) at a
+    time. At most FILES_IN_FLIGHT_PER_WORKER files per worker are submitted at once and
+    a new one is submitted as each finishes, so loading and embedding overlap and memory
+    holds about one batch of chunks plus the files in flight.
+
+    Parameters:
+    - source_directory (str): Directory of the documents, searched recursively for every
+      DOCUMENT_MAP extension.
+    - writer (FaissWriter or ChromaWriter): The vector store to write to.
+    - workers (int): Processes loading and splitting files.
+    - embedding_batch_size (int): Chunks embedded together.
+
+    Returns:
+    - dict: Counts, timings and the documents/sec and chunks/sec rates of the run.
+    """
+    start = time.perf_counter()
+    file_paths = source_files(source_directory)
+    to_embed, removed = writer.plan(file_paths, source_directory)
+    logging.info(
+        f"{len(file_paths)} files in {source_directory}: {len(to_embed)} to ingest, "
+        f"{len(file_paths) - len(to_embed)} unchanged, {removed} removed or replaced"
+    )
+
+    stats = {"files": 0, "failed": 0, "documents": 0, "chunks": 0, "embedding_seconds": 0.0}
+    pending = []
+    pending_chunks = 0
+
+    def flush():
+        embedding_start = time.perf_counter()
+        writer.write(pending)
+        stats["embedding_seconds"] += time.perf_counter() - embedding_start
+        pending.clear()
+
+    files = iter(to_embed)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        def submit(count):
+            for relative_path, file_path, sha256 in islice(files, count):
+                future = executor.submit(load_document_chunks, file_path)
+                futures[future] = (relative_path, file_path, sha256)
+
+        submit(workers * FILES_IN_FLIGHT_PER_WORKER)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative_path, file_path, sha256 = futures.pop(future)
+                try:
+                    document_count, chunks = future.result()
+                except Exception:
+                    logging.exception(f"Failed to load {file_path}")
+                    stats["failed"] += 1
+                    continue
+
+                stats["files"] += 1
+                stats["documents"] += document_count
+                stats["chunks"] += len(chunks)
+                pending.append((relative_path, file_path, sha256, chunks))
+                pending_chunks += len(chunks)
+            submit(len(done))
+            if pending_chunks >= embedding_batch_size:
+                flush()
+                pending_chunks = 0
+                logging.info(f"[{stats['files']}/{len(to_embed)}] files ingested, {stats['chunks']} chunks")
+    if pending:
+        flush()
+    writer.close()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["documents_per_second"] = stats["documents"] / stats["seconds"]
+    stats["chunks_per_second"] = stats["chunks"] / stats["seconds"]
+    stats["embedding_chunks_per_second"] = (
+        stats["chunks"] / stats["embedding_seconds"] if stats["embedding_seconds"] else None
+    )
+    return stats
+
+
+@click.command()
+@click.option(
+    "--device_type",
+    default="cuda" if torch.cuda.is_available() else "cpu",
+    type=click.Choice(["cpu", "cuda", "mps"]),
+    help="Device to run the embedding model on. (Default is cuda)",
+)
+@click.option(
+    "--source_directory",
+    default=SOURCE_DIRECTORY,
+    help="Directory of the documents to ingest (Default is data/)",
+)
+@click.option(
+    "--store",
+    default="faiss",
+    type=click.Choice(VECTOR_STORES),
+    help="Vector store to write: the incremental FAISS index or Chroma (Default is faiss)",
+)
+@click.option(
+    "--workers",
+    default=INGEST_THREADS,
+    type=int,
+    help="Processes loading and splitting files (Default is INGEST_THREADS)",
+)
+@click.option(
+    "--embedding_batch_size",
+    default=EMBEDDING_BATCH_SIZE,
+    type=int,
+    help=f"Chunks embedded together (Default is {EMBEDDING_BATCH_SIZE})",
+)
+@click.option(
+    "--embedding_cache",
+    default=None,
+    help="Directory of the shared embedding cache, so unchanged chunks are not embedded again (Default is no cache)",
+)
+@click.option(
+    "--embedding_dtype",
+    default="float32",
+    type=click.Choice(EMBEDDING_DTYPES),
+    help="Precision of the vectors stored in the embedding cache (Default is float32)",
+)
+def main(device_type, source_directory, store, workers, embedding_batch_size, embedding_cache, embedding_dtype):
+    """
+    Ingests every document type in DOCUMENT_MAP into the vector store used for retrieval.
+    """
+    logging.info(f"Running on: {device_type}")
+    embeddings = get_embeddings(device_type)
+    cache = EmbeddingCache(embedding_cache, dtype=embedding_dtype) if embedding_cache else None
+    writer = FaissWriter(embeddings, cache) if store == "faiss" else ChromaWriter(embeddings, cache)
+
+    stats = run_ingest(source_directory, writer, workers, embedding_batch_size)
+    logging.info(
+        f"Ingested {stats['files']} files ({stats['failed']} failed), {stats['documents']} documents "
+        f"and {stats['chunks']} chunks in {stats['seconds']:.1f}s: "
+        f"{stats['documents_per_second']:.1f} documents/sec, {stats['chunks_per_second']:.1f} chunks/sec"
+    )
+    if stats["embedding_chunks_per_second"]:
+        logging.info(
+            f"Embedding took {stats['embedding_seconds']:.1f}s, "
+            f"{stats['embedding_chunks_per_second']:.1f} chunks/sec"
+        )
+    if cache is not None:
+        logging.info(f"Embedding cache: {cache.stats()}")
+        cache.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
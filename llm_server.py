@@ -0,0 +1,250 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import click
+import torch
+from flask import Flask, Response, jsonify, request
+
+from modules.load_models import get_llm
+from modules.metrics import Metrics
+from modules.model_registry import registry
+from modules.qa_pipeline import question_pipeline
+
+from modules.constants import (
+    MODEL_ID,
+    MODEL_BASENAME,
+)
+
+# Prefix of the Prometheus metrics served on /metrics
+SERVER_METRICS_PREFIX = "local_llm"
+
+
+class QueueFull(Exception):
+    """Raised when every generation slot is busy and the waiting queue is full."""
+
+
+class QueueTimeout(Exception):
+    """Raised when a request waited longer than the queue timeout for a generation slot."""
+
+
+class RequestLimiter:
+    """
+    Admission control in front of the model: bounded concurrency plus a bounded wait queue.
+
+    At most `max_concurrency` requests generate at the same time and at most `max_queue`
+    more wait for a slot. Further requests are rejected straight away instead of piling up
+    behind a model that can only serve a few at a time.
+
+    Parameters:
+    - max_concurrency (int): Requests allowed to generate concurrently.
+    - max_queue (int): Requests allowed to wait for a slot.
+    - queue_timeout (float): Seconds a request may wait before it is given up.
+    """
+
+    def __init__(self, max_concurrency=1, max_queue=8, queue_timeout=300.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @contextmanager
+    def slot(self):
+        """Wait for a generation slot; raises QueueFull or QueueTimeout instead of waiting forever."""
+        with self.condition:
+            if self.in_flight >= self.max_concurrency and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull()
+            self.queued += 1
+            try:
+                if not self.condition.wait_for(
+                    lambda: self.in_flight < self.max_concurrency, timeout=self.queue_timeout
+                ):
+                    self.timed_out += 1
+                    raise QueueTimeout()
+            finally:
+                self.queued -= 1
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify()
+
+
+def create_app(answer, limiter, model_info):
+    """
+    Build the Flask app serving an already loaded model.
+
+    Parameters:
+    - answer (callable): Generates the answer to one question.
+    - limiter (RequestLimiter): Concurrency and queue limits.
+    - model_info (dict): Static details reported by /health, e.g. the model id and load time.
+
+    Endpoints:
+    - POST /query with {"question": ...}: the answer with its queue and generation times.
+    - GET /health: liveness, model details and current load.
+    - GET /metrics: latency histograms and counters in the Prometheus text format.
+    """
+    app = Flask(__name__)
+    metrics = Metrics(enabled=True)
+    responses = {}
+    responses_lock = threading.Lock()
+
+    def respond(status, body):
+        with responses_lock:
+            responses[status] = responses.get(status, 0) + 1
+        return jsonify(body), status
+
+    @app.post("/query")
+    def query():
+        payload = request.get_json(silent=True) or {}
+        question = payload.get("question")
+        if not isinstance(question, str) or not question.strip():
+            return respond(400, {"error": "Expected a JSON body with a non-empty 'question'"})
+
+        arrived = time.perf_counter()
+        try:
+            with limiter.slot():
+                started = time.perf_counter()
+                metrics.observe("queue_wait", started - arrived)
+                result = answer(question)
+                generation_seconds = time.perf_counter() - started
+                metrics.observe("generation", generation_seconds)
+        except QueueFull:
+            response, status = respond(503, {"error": "Too many requests waiting, retry later"})
+            response.headers["Retry-After"] = "5"
+            return response, status
+        except QueueTimeout:
+            return respond(503, {"error": "Timed out waiting for a generation slot"})
+        except Exception:
+            logging.exception(f"Failed to answer {question!r}")
+            return respond(500, {"error": "Generation failed"})
+
+        return respond(
+            200,
+            {
+                "question": question,
+                "answer": result,
+                "queue_seconds": started - arrived,
+                "generation_seconds": generation_seconds,
+            },
+        )
+
+    @app.get("/health")
+    def health():
+        return jsonify(
+            {
+                "status": "ok",
+                **model_info,
+                "in_flight": limiter.in_flight,
+                "queued": limiter.queued,
+                "max_concurrency": limiter.max_concurrency,
+                "max_queue": limiter.max_queue,
+            }
+        )
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        prefix = SERVER_METRICS_PREFIX
+        lines = [
+            f"# TYPE {prefix}_in_flight gauge",
+            f"{prefix}_in_flight {limiter.in_flight}",
+            f"# TYPE {prefix}_queued gauge",
+            f"{prefix}_queued {limiter.queued}",
+            f"# TYPE {prefix}_rejected_total counter",
+            f"{prefix}_rejected_total {limiter.rejected}",
+            f"# TYPE {prefix}_queue_timeouts_total counter",
+            f"{prefix}_queue_timeouts_total {limiter.timed_out}",
+            f"# TYPE {prefix}_model_load_seconds gauge",
+            f"{prefix}_model_load_seconds {model_info.get('model_load_seconds', 0)}",
+            f"# TYPE {prefix}_registry_model_resident_bytes gauge",
+        ]
+        # Every model the process holds in the shared registry, e.g. embeddings next to the LLM
+        for name, info in registry.report().items():
+            if info["loaded"]:
+                label = "/".join(str(part) for part in name if part) if isinstance(name, tuple) else name
+                lines.append(f'{prefix}_registry_model_resident_bytes{{model="{label}"}} {info["resident_bytes"]}')
+        lines.append(f"# TYPE {prefix}_responses_total counter")
+        with responses_lock:
+            lines.extend(
+                f'{prefix}_responses_total{{status="{status}"}} {count}'
+                for status, count in sorted(responses.items())
+            )
+        text = metrics.prometheus_text(prefix=prefix, description="local LLM server") + "\n".join(lines) + "\n"
+        return Response(text, mimetype="text/plain; version=0.0.4")
+
+    return app
+
+
+@click.command()
+@click.option(
+    "--device_type",
+    default="cuda" if torch.cuda.is_available() else "cpu",
+    type=click.Choice(["cpu", "cuda", "mps"]),
+    help="Device to run on. (Default is cuda)",
+)
+@click.option(
+    "--use_history",
+    "-h",
+    is_flag=True,
+    help="Use history (Default is False)",
+)
+@click.option("--host", default="127.0.0.1", help="Address to listen on (Default is 127.0.0.1)")
+@click.option("--port", default=5110, type=int, help="Port to listen on (Default is 5110)")
+@click.option(
+    "--max_concurrency",
+    default=1,
+    type=int,
+    help="Requests generating at the same time (Default is 1)",
+)
+@click.option(
+    "--max_queue",
+    default=8,
+    type=int,
+    help="Requests waiting for a slot before new ones are rejected with 503 (Default is 8)",
+)
+@click.option(
+    "--queue_timeout",
+    default=300.0,
+    type=float,
+    help="Seconds a request may wait for a slot (Default is 300)",
+)
+def main(device_type, use_history, host, port, max_concurrency, max_queue, queue_timeout):
+    """
+    Serves the local LLM over HTTP, loading the model once and keeping it in memory.
+
+    Query it with: curl -X POST localhost:5110/query -H 'Content-Type: application/json'
+    -d '{"question": "What is electroencephalography?"}'
+    """
+    logging.info(f"Running on: {device_type}")
+    started = time.perf_counter()
+    llm = get_llm(device_type)
+    model_load_seconds = time.perf_counter() - started
+    logging.info(f"Loaded {MODEL_ID} in {model_load_seconds:.1f}s")
+
+    app = create_app(
+        lambda question: question_pipeline(device_type, use_history, question, llm=llm),
+        RequestLimiter(max_concurrency, max_queue, queue_timeout),
+        {
+            "model_id": MODEL_ID,
+            "model_basename": MODEL_BASENAME,
+            "device_type": device_type,
+            "model_load_seconds": model_load_seconds,
+        },
+    )
+    # Threaded, so health and metrics stay responsive while a request is generating
+    app.run(host=host, port=port, threaded=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(filename)s:%(lineno)s - %(message)s", level=logging.INFO
+    )
+    main()
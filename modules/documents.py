@@ -0,0 +1,48 @@
+import os
+
+from langchain.text_splitter import Language, RecursiveCharacterTextSplitter
+
+from modules.constants import DOCUMENT_MAP
+
+# Text splitting of the source documents; changing it rebuilds the FAISS index
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+
+def source_files(source_directory):
+    """Return the files under `source_directory`, recursively, that DOCUMENT_MAP has a loader for."""
+    paths = []
+    for directory, _, file_names in os.walk(source_directory):
+        for file_name in file_names:
+            if os.path.splitext(file_name)[1].lower() in DOCUMENT_MAP:
+                paths.append(os.path.join(directory, file_name))
+    return sorted(paths)
+
+
+def load_documents(file_path):
+    """Load a file with the DOCUMENT_MAP loader of its extension."""
+    loader_class = DOCUMENT_MAP[os.path.splitext(file_path)[1].lower()]
+    return loader_class(file_path).load()
+
+
+def split_documents(documents, file_path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Split loaded documents into chunks, along function and class boundaries for Python files."""
+    if file_path.lower().endswith(".py"):
+        text_splitter = RecursiveCharacterTextSplitter.from_language(
+            language=Language.PYTHON, chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_documents(documents)
+
+
+def load_document_chunks(file_path, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Load and split one source file.
+
+    Returns:
+    - tuple: The number of documents the loader produced (e.g. one per PDF page or CSV
+      row) and the list of chunks.
+    """
+    documents = load_documents(file_path)
+    return len(documents), split_documents(documents, file_path, chunk_size, chunk_overlap)
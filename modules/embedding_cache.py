@@ -0,0 +1,366 @@
+import os
+import time
+import hashlib
+import sqlite3
+from urllib.parse import quote
+
+import numpy as np
+
+from modules.constants import EMBEDDING_MODEL_NAME, PERSIST_DIRECTORY
+
+# Default location of the embedding caches, one subdirectory per model and dtype
+EMBEDDING_CACHE_DIRECTORY = os.path.join(PERSIST_DIRECTORY, "embedding_cache")
+
+EMBEDDING_DTYPES = ["float32", "float16"]
+
+# Keys are looked up in groups of this size to stay below SQLite's variable limit
+SQLITE_BATCH_SIZE = 500
+
+# Bytes of the SHA-256 of a chunk kept as its key; 128 bits make collisions negligible
+KEY_BYTES = 16
+
+# Lookups that lost their vectors file to another process's compaction are retried this
+# many times on the new generation before the error is raised
+LOOKUP_RETRIES = 3
+
+
+def chunk_key(text):
+    """Content address of a chunk: the first KEY_BYTES of the SHA-256 of its exact text."""
+    return hashlib.sha256(text.encode("utf-8")).digest()[:KEY_BYTES]
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of chunk embeddings for one embedding model.
+
+    Vectors are appended to a flat float32 or float16 file that is memory-mapped for
+    reads, and a SQLite key index maps the hash of each chunk's text to its row. Cached
+    vectors are returned as read-only views into the mapping, so a hit copies nothing
+    until the vector store takes its own copy.
+
+    Parameters:
+    - root (str): Directory holding the caches; this model's cache is a subdirectory.
+    - model_name (str): The embedding model; each model gets its own vectors and keys.
+    - dtype (str): "float32", or "float16" to halve the file at a small precision cost.
+
+    Notes:
+    - Several processes can share a cache. Appends are serialised by a SQLite write
+      transaction, which also checks for keys another process has added meanwhile.
+    - `compact` rewrites the vectors into a new file with the next generation number,
+      dropping unused rows. Readers notice the new generation on their next lookup and
+      remap; views handed out earlier keep pointing at the old, unchanged file.
+    - Hit and miss counters are kept per instance and returned by `stats`.
+    """
+
+    def __init__(self, root=EMBEDDING_CACHE_DIRECTORY, model_name=EMBEDDING_MODEL_NAME, dtype="float32"):
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unknown embedding dtype '{dtype}', expected one of {EMBEDDING_DTYPES}")
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self.directory = os.path.join(root, f"{quote(model_name, safe='')}.{dtype}")
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._pid = None
+        self._vectors = None
+        self._generation = None
+
+    @property
+    def connection(self):
+        # Connections must not cross a fork, so reopen in every new process
+        if self._connection is None or self._pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            self._connection = sqlite3.connect(
+                os.path.join(self.directory, "keys.sqlite"), timeout=60, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key BLOB PRIMARY KEY,
+                    row INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value) WITHOUT ROWID"
+            )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO meta (name, value) VALUES ('model', ?), ('rows', 0), ('generation', 0)",
+                (self.model_name,),
+            )
+            self._pid = os.getpid()
+            self._vectors = None
+            self._generation = None
+        return self._connection
+
+    def _meta(self):
+        return dict(self.connection.execute("SELECT name, value FROM meta").fetchall())
+
+    def _vectors_path(self, generation):
+        return os.path.join(self.directory, f"vectors-{generation}.bin")
+
+    def _mapped(self, meta, needed_rows):
+        """Return the memory map of the current generation, remapped if it changed or grew."""
+        generation = meta["generation"]
+        if self._vectors is None or self._generation != generation or len(self._vectors) < needed_rows:
+            dimension = meta["dimension"]
+            path = self._vectors_path(generation)
+            rows = os.path.getsize(path) // (dimension * self.dtype.itemsize)
+            self._vectors = np.memmap(path, dtype=self.dtype, mode="r", shape=(rows, dimension))
+            self._generation = generation
+        return self._vectors
+
+    def get_many(self, texts):
+        """
+        Look up the embeddings of a list of chunk texts.
+
+        Returns:
+        - list: For each text, a read-only vector view into the cache, or None when missing.
+        """
+        keys = [chunk_key(text) for text in texts]
+        now = time.time()
+        for attempt in range(LOOKUP_RETRIES + 1):
+            generation = self._meta()["generation"]
+            try:
+                rows, stale, vectors = self._lookup(list(dict.fromkeys(keys)), now)
+                break
+            except FileNotFoundError:
+                # Another process may have compacted the cache between reading the keys and
+                # mapping the vectors; if the generation did not change, the file is really missing
+                if attempt == LOOKUP_RETRIES or self._meta()["generation"] == generation:
+                    raise
+
+        found = [vectors[rows[key]] if key in rows else None for key in keys]
+        hits = sum(key in rows for key in keys)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        if stale:
+            # Last use is only refreshed once a day per entry, so most hits never write
+            self.connection.execute("BEGIN IMMEDIATE")
+            for start in range(0, len(stale), SQLITE_BATCH_SIZE):
+                batch = stale[start : start + SQLITE_BATCH_SIZE]
+                self.connection.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(batch))})",
+                    [now] + batch,
+                )
+            self.connection.execute("COMMIT")
+        return found
+
+    def _lookup(self, unique_keys, now):
+        rows = {}
+        stale = []
+        # One read transaction, so the rows and the generation they belong to match
+        self.connection.execute("BEGIN")
+        try:
+            meta = self._meta()
+            for start in range(0, len(unique_keys), SQLITE_BATCH_SIZE):
+                batch = unique_keys[start : start + SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                for key, row, last_used in self.connection.execute(
+                    f"SELECT key, row, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    rows[key] = row
+                    if last_used < now - 86400:
+                        stale.append(key)
+            vectors = self._mapped(meta, max(rows.values()) + 1) if rows else None
+        finally:
+            self.connection.execute("COMMIT")
+        return rows, stale, vectors
+
+    def put_many(self, texts, vectors):
+        """Append the embeddings of chunks that no process has cached yet."""
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        if not len(texts):
+            return
+        keys = [chunk_key(text) for text in texts]
+        now = time.time()
+        # A write transaction serialises appends across processes
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            meta = self._meta()
+            dimension = meta.get("dimension")
+            if dimension is None:
+                dimension = vectors.shape[1]
+                self.connection.execute("INSERT INTO meta (name, value) VALUES ('dimension', ?)", (dimension,))
+            elif dimension != vectors.shape[1]:
+                raise ValueError(f"Embedding cache holds {dimension}-dimensional vectors, got {vectors.shape[1]}")
+
+            existing = set()
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), SQLITE_BATCH_SIZE):
+                batch = unique_keys[start : start + SQLITE_BATCH_SIZE]
+                existing.update(
+                    key
+                    for (key,) in self.connection.execute(
+                        f"SELECT key FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                    )
+                )
+            new = {}
+            for index, key in enumerate(keys):
+                if key not in existing and key not in new:
+                    new[key] = index
+            if not new:
+                self.connection.execute("COMMIT")
+                return
+
+            first_row = meta["rows"]
+            with open(self._vectors_path(meta["generation"]), "ab") as vectors_file:
+                # Rows past meta["rows"] were left by an interrupted append; overwrite them
+                vectors_file.truncate(first_row * dimension * self.dtype.itemsize)
+                vectors_file.write(np.ascontiguousarray(vectors[list(new.values())]).tobytes())
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+            self.connection.executemany(
+                "INSERT INTO embeddings (key, row, last_used) VALUES (?, ?, ?)",
+                [(key, first_row + offset, now) for offset, key in enumerate(new)],
+            )
+            self.connection.execute(
+                "UPDATE meta SET value = ? WHERE name = 'rows'", (first_row + len(new),)
+            )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def embed(self, texts, embed_documents):
+        """
+        Return the embeddings of `texts`, computing only the missing ones.
+
+        Parameters:
+        - texts (list[str]): The chunk texts.
+        - embed_documents (callable): Embeds a list of texts, e.g. `embeddings.embed_documents`;
+          called once with every distinct text that is not cached.
+
+        Returns:
+        - list: One vector per text; cached ones are views into the memory map, and
+          repeated texts share one vector.
+        """
+        vectors = self.get_many(texts)
+        # Indices of each missing text, so repeated chunks (e.g. boilerplate) are embedded once
+        missing = {}
+        for index, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(texts[index], []).append(index)
+        if missing:
+            distinct = list(missing)
+            computed = embed_documents(distinct)
+            self.put_many(distinct, computed)
+            for text, vector in zip(distinct, computed):
+                for index in missing[text]:
+                    vectors[index] = vector
+        return vectors
+
+    def stats(self):
+        """Return the hit/miss counters of this instance and the size of the shared cache."""
+        lookups = self.hits + self.misses
+        meta = self._meta()
+        entries = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        vectors_path = self._vectors_path(meta["generation"])
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "unused_rows": meta["rows"] - entries,
+            "dimension": meta.get("dimension"),
+            "dtype": self.dtype.name,
+            "vector_bytes": os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0,
+        }
+
+    def compact(self, max_age_days=None):
+        """
+        Rewrite the vectors file without unused rows, optionally dropping old entries first.
+
+        Parameters:
+        - max_age_days (float): Also drop entries not used for this many days (Default keeps all).
+
+        Returns:
+        - dict: The entries dropped and kept, and the vector file size before and after.
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            meta = self._meta()
+            old_path = self._vectors_path(meta["generation"])
+            bytes_before = os.path.getsize(old_path) if os.path.exists(old_path) else 0
+            dropped = 0
+            if max_age_days is not None:
+                dropped = self.connection.execute(
+                    "DELETE FROM embeddings WHERE last_used < ?", (time.time() - max_age_days * 86400,)
+                ).rowcount
+            entries = self.connection.execute("SELECT key, row FROM embeddings ORDER BY row").fetchall()
+
+            generation = meta["generation"] + 1
+            new_path = self._vectors_path(generation)
+            if entries:
+                old_vectors = np.memmap(
+                    old_path, dtype=self.dtype, mode="r", shape=(meta["rows"], meta["dimension"])
+                )
+                with open(new_path, "wb") as vectors_file:
+                    for start in range(0, len(entries), SQLITE_BATCH_SIZE):
+                        rows = [row for _, row in entries[start : start + SQLITE_BATCH_SIZE]]
+                        vectors_file.write(np.ascontiguousarray(old_vectors[rows]).tobytes())
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+                del old_vectors
+            else:
+                open(new_path, "wb").close()
+            self.connection.executemany(
+                "UPDATE embeddings SET row = ? WHERE key = ?",
+                [(new_row, key) for new_row, (key, _) in enumerate(entries)],
+            )
+            self.connection.execute("UPDATE meta SET value = ? WHERE name = 'rows'", (len(entries),))
+            self.connection.execute("UPDATE meta SET value = ? WHERE name = 'generation'", (generation,))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        # Processes still mapping the old file keep it alive until they remap
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+        return {
+            "dropped": dropped,
+            "entries": len(entries),
+            "vector_bytes_before": bytes_before,
+            "vector_bytes_after": os.path.getsize(new_path),
+        }
+
+    def __getstate__(self):
+        # Sent to worker processes without the connection and mapping, which they reopen
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        state["_vectors"] = None
+        state["_generation"] = None
+        return state
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._vectors = None
+
+
+class CachedEmbeddings:
+    """
+    Embeddings wrapper answering `embed_documents` from an EmbeddingCache.
+
+    Used where a vector store embeds texts itself (Chroma). Vectors are returned as
+    lists, as langchain expects; queries are not cached, since instruction models
+    embed them differently from documents.
+    """
+
+    def __init__(self, embeddings, cache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        vectors = self.cache.embed(texts, self.embeddings.embed_documents)
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
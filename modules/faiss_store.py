@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import logging
+
+from langchain.vectorstores import FAISS
+
+from modules.constants import DOCUMENT_MAP, EMBEDDING_MODEL_NAME, PERSIST_DIRECTORY, SOURCE_DIRECTORY
+from modules.documents import CHUNK_OVERLAP, CHUNK_SIZE, load_document_chunks, source_files
+from modules.file_utils import file_sha256, write_atomically
+
+# Where the FAISS index of the source documents and its manifest are kept
+FAISS_INDEX_DIRECTORY = os.path.join(PERSIST_DIRECTORY, "faiss")
+
+FAISS_INDEX_NAME = "index"
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def chunk_ids(relative_path, sha256, count):
+    """Stable docstore ids of the chunks of one version of a file."""
+    return [f"{relative_path}:{sha256[:16]}:{index}" for index in range(count)]
+
+
+class FaissIndexStore:
+    """
+    FAISS index persisted in a directory together with a manifest of the files it holds.
+
+    The manifest records, for every source file, its size, modification time, SHA-256
+    and the docstore ids of its chunks. `changes` compares it with the files on disk, so
+    only new or changed files need to be split and embedded again, and the chunks of
+    changed or removed files can be deleted by id.
+
+    Parameters:
+    - embeddings: The langchain embeddings used to embed chunks and queries.
+    - index_directory (str): Where the index and the manifest are saved.
+    - embedding_model_name (str): Recorded in the manifest; a different model rebuilds the index.
+    - chunk_size (int), chunk_overlap (int): Splitter settings, recorded the same way.
+    - document_map (dict): Loader class of each extension, recorded by name the same way,
+      since another loader produces different chunks (Default is DOCUMENT_MAP).
+
+    Notes:
+    - Files whose size and modification time match the manifest are not read at all;
+      the others are hashed, so touching a file without changing it costs no embedding.
+    - The index files are written first and the manifest last. An index that does not
+      match its manifest (e.g. after a crash in between) is discarded and rebuilt.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        index_directory=FAISS_INDEX_DIRECTORY,
+        embedding_model_name=EMBEDDING_MODEL_NAME,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        document_map=DOCUMENT_MAP,
+    ):
+        self.embeddings = embeddings
+        self.index_directory = index_directory
+        self.settings = {
+            "embedding_model": embedding_model_name,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "loaders": {extension: loader.__name__ for extension, loader in sorted(document_map.items())},
+        }
+        self.vector_store = None
+        self.files = {}
+        self.load()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.index_directory, MANIFEST_FILE_NAME)
+
+    def load(self):
+        """Load the saved index if it exists, was built with the same settings and matches its manifest."""
+        index_path = os.path.join(self.index_directory, f"{FAISS_INDEX_NAME}.faiss")
+        if not (os.path.exists(self.manifest_path) and os.path.exists(index_path)):
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("settings") != self.settings:
+            logging.info(f"Index settings changed to {self.settings}, rebuilding the FAISS index")
+            return
+
+        vector_store = FAISS.load_local(self.index_directory, self.embeddings, index_name=FAISS_INDEX_NAME)
+        indexed_ids = set(vector_store.index_to_docstore_id.values())
+        manifest_ids = {chunk_id for entry in manifest["files"].values() for chunk_id in entry["ids"]}
+        if indexed_ids != manifest_ids:
+            logging.warning("FAISS index does not match its manifest, rebuilding it")
+            return
+        self.vector_store = vector_store
+        self.files = manifest["files"]
+
+    def changes(self, file_paths, root):
+        """
+        Compare files on disk with the manifest.
+
+        Parameters:
+        - file_paths (list[str]): The source files that should be indexed.
+        - root (str): Directory the manifest paths are relative to.
+
+        Returns:
+        - tuple: A list of `(relative_path, file_path, sha256)` to embed, and the relative
+          paths of indexed files that are gone or changed and must be removed.
+        """
+        to_embed = []
+        to_remove = []
+        current = set()
+        for file_path in file_paths:
+            relative_path = os.path.relpath(file_path, root)
+            current.add(relative_path)
+            file_stat = os.stat(file_path)
+            entry = self.files.get(relative_path)
+            if entry and entry["size"] == file_stat.st_size and entry["mtime_ns"] == file_stat.st_mtime_ns:
+                continue
+            sha256 = file_sha256(file_path)
+            if entry and entry["sha256"] == sha256:
+                # Touched but unchanged: only the recorded modification time is stale
+                entry["mtime_ns"] = file_stat.st_mtime_ns
+                continue
+            if entry:
+                to_remove.append(relative_path)
+            to_embed.append((relative_path, file_path, sha256))
+        to_remove.extend(relative_path for relative_path in self.files if relative_path not in current)
+        return to_embed, to_remove
+
+    def remove(self, relative_paths):
+        """Delete the chunks of files from the index, in one pass over the index."""
+        ids = [chunk_id for relative_path in relative_paths for chunk_id in self.files.pop(relative_path)["ids"]]
+        if ids:
+            self.vector_store.delete(ids)
+
+    def add(self, relative_path, file_path, sha256, chunks, vectors=None):
+        """
+        Add the chunks of one file version to the index.
+
+        Parameters:
+        - relative_path (str), file_path (str), sha256 (str): The file, as returned by `changes`.
+        - chunks (list[Document]): Its chunks.
+        - vectors (list[list[float]]): Their embeddings, when already computed (Default is
+          to embed all chunks in one `embed_documents` call).
+        """
+        file_stat = os.stat(file_path)
+        ids = chunk_ids(relative_path, sha256, len(chunks))
+        if chunks:
+            texts = [chunk.page_content for chunk in chunks]
+            if vectors is None:
+                vectors = self.embeddings.embed_documents(texts)
+            metadatas = [chunk.metadata for chunk in chunks]
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_embeddings(
+                    list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids
+                )
+            else:
+                self.vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        self.files[relative_path] = {
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "sha256": sha256,
+            "ids": ids,
+        }
+
+    def save(self):
+        """Write the index, then the manifest, each replacing the previous version atomically."""
+        os.makedirs(self.index_directory, exist_ok=True)
+        if self.vector_store is not None:
+            temporary_name = f".{FAISS_INDEX_NAME}.tmp"
+            self.vector_store.save_local(self.index_directory, index_name=temporary_name)
+            for extension in ("faiss", "pkl"):
+                os.replace(
+                    os.path.join(self.index_directory, f"{temporary_name}.{extension}"),
+                    os.path.join(self.index_directory, f"{FAISS_INDEX_NAME}.{extension}"),
+                )
+        write_atomically(
+            self.manifest_path, json.dumps({"settings": self.settings, "files": self.files}, indent=1)
+        )
+
+
+def update_faiss_index(embeddings, source_directory=SOURCE_DIRECTORY, index_directory=FAISS_INDEX_DIRECTORY):
+    """
+    Bring the persisted FAISS index of the documents in `source_directory` up to date and return it.
+
+    Only files that are new or whose content changed since the last run are loaded, split
+    and embedded; chunks of changed and deleted files are removed. Startup therefore costs
+    one `stat` per file plus the work for the changes, instead of re-embedding the corpus.
+    ingest.py does the same with a process pool, for large updates. Files that fail to
+    load are logged and skipped, and retried on the next run.
+
+    Parameters:
+    - embeddings: The langchain embeddings.
+    - source_directory (str): Directory of the documents (every DOCUMENT_MAP type).
+    - index_directory (str): Where the index and its manifest are persisted.
+
+    Returns:
+    - FAISS: The up-to-date vector store.
+    """
+    start = time.perf_counter()
+    store = FaissIndexStore(embeddings, index_directory=index_directory)
+    file_paths = source_files(source_directory)
+    to_embed, to_remove = store.changes(file_paths, source_directory)
+
+    store.remove(to_remove)
+    chunk_count = 0
+    failed = 0
+    for relative_path, file_path, sha256 in to_embed:
+        try:
+            _, chunks = load_document_chunks(
+                file_path, store.settings["chunk_size"], store.settings["chunk_overlap"]
+            )
+        except Exception:
+            logging.exception(f"Failed to load {file_path}")
+            failed += 1
+            continue
+        store.add(relative_path, file_path, sha256, chunks)
+        chunk_count += len(chunks)
+    store.save()
+
+    if store.vector_store is None:
+        raise ValueError(f"No documents to index in {source_directory}")
+    logging.info(
+        f"FAISS index up to date in {time.perf_counter() - start:.2f}s: "
+        f"{len(file_paths) - len(to_embed)} files unchanged, {len(to_embed) - failed} embedded "
+        f"({chunk_count} chunks), {failed} failed, {len(to_remove)} removed or replaced"
+    )
+    return store.vector_store
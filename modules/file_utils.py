@@ -0,0 +1,19 @@
+import os
+import hashlib
+
+
+def file_sha256(file_path, block_size=1 << 20):
+    """Return the SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as source_file:
+        for block in iter(lambda: source_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_atomically(path, content):
+    """Replace a text file in one step, so readers never see it half-written."""
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as output_file:
+        output_file.write(content)
+    os.replace(temporary_path, path)
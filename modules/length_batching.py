@@ -0,0 +1,136 @@
+import logging
+
+# Upper bound of padded tokens (batch size x longest sequence) in one forward pass
+DEFAULT_TOKEN_BUDGET = 4096
+
+# Used when a tokenizer does not declare a usable maximum length
+FALLBACK_MAX_LENGTH = 512
+
+
+class PaddingStats:
+    """
+    Padding efficiency of the batches sent to one classifier.
+
+    `padded_tokens` counts what the model actually computes (every sequence padded to
+    the longest one in its batch); `naive_padded_tokens` counts what batches of the same
+    size in input order would have computed, for comparison.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.sentences = 0
+        self.truncated = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.naive_padded_tokens = 0
+
+    def summary(self):
+        return {
+            "batches": self.batches,
+            "sentences": self.sentences,
+            "truncated": self.truncated,
+            "real_tokens": self.real_tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_efficiency": self.real_tokens / self.padded_tokens if self.padded_tokens else None,
+            "naive_padding_efficiency": (
+                self.real_tokens / self.naive_padded_tokens if self.naive_padded_tokens else None
+            ),
+        }
+
+
+def model_max_length(tokenizer):
+    """The longest input the model accepts, ignoring the huge placeholder some tokenizers report."""
+    max_length = getattr(tokenizer, "model_max_length", None)
+    if not max_length or max_length > 100_000:
+        return FALLBACK_MAX_LENGTH
+    return max_length
+
+
+def length_batches(lengths, token_budget=DEFAULT_TOKEN_BUDGET, max_batch_size=None):
+    """
+    Group sequence indices into batches of similar length under a padded-token budget.
+
+    Indices are sorted from the longest sequence to the shortest and cut greedily, so a
+    batch is closed as soon as one more sequence would push batch size x longest length
+    over `token_budget` (or the batch would exceed `max_batch_size`). A sequence longer
+    than the budget still gets a batch of its own.
+
+    Returns:
+    - list[list[int]]: Batches of indices into `lengths`.
+    """
+    order = sorted(range(len(lengths)), key=lambda index: lengths[index], reverse=True)
+    batches = []
+    batch = []
+    for index in order:
+        if batch:
+            # Sorted in decreasing order, so the first sequence is the longest of the batch
+            too_many_tokens = (len(batch) + 1) * lengths[batch[0]] > token_budget
+            too_many_sequences = max_batch_size and len(batch) >= max_batch_size
+            if too_many_tokens or too_many_sequences:
+                batches.append(batch)
+                batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class LengthBucketedClassifier:
+    """
+    Batching layer in front of a transformers text-classification pipeline.
+
+    Sentences are tokenized once to measure their length, grouped by length into
+    batches capped by a padded-token budget, classified batch by batch with explicit
+    truncation to the model's maximum length, and returned in the original order.
+    Anything else, including single strings, goes straight to the wrapped pipeline.
+
+    Parameters:
+    - pipeline: The wrapped pipeline; it must have a `tokenizer`.
+    - token_budget (int): Maximum padded tokens per batch.
+    - stats (PaddingStats): Where padding efficiency is accumulated (Default is a new one).
+    """
+
+    def __init__(self, pipeline, token_budget=DEFAULT_TOKEN_BUDGET, stats=None):
+        self.pipeline = pipeline
+        self.token_budget = token_budget
+        self.max_length = model_max_length(pipeline.tokenizer)
+        self.stats = stats if stats is not None else PaddingStats()
+
+    def __getattr__(self, name):
+        return getattr(self.pipeline, name)
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        kwargs.setdefault("truncation", True)
+        kwargs.setdefault("max_length", self.max_length)
+        if isinstance(inputs, str) or not inputs:
+            return self.pipeline(inputs, **kwargs)
+
+        inputs = list(inputs)
+        token_ids = self.pipeline.tokenizer(inputs, truncation=False)["input_ids"]
+        lengths = [min(len(ids), self.max_length) for ids in token_ids]
+        truncated = sum(len(ids) > self.max_length for ids in token_ids)
+        if truncated:
+            logging.info(f"Truncating {truncated} sentences to {self.max_length} tokens")
+
+        results = [None] * len(inputs)
+        for batch in length_batches(lengths, self.token_budget, max_batch_size=batch_size):
+            outputs = self.pipeline(
+                [inputs[index] for index in batch], batch_size=len(batch), **kwargs
+            )
+            for index, output in zip(batch, outputs):
+                results[index] = output
+            self.stats.batches += 1
+            self.stats.padded_tokens += len(batch) * lengths[batch[0]]
+
+        naive_batch_size = batch_size or len(inputs)
+        self.stats.naive_padded_tokens += sum(
+            len(lengths[start : start + naive_batch_size]) * max(lengths[start : start + naive_batch_size])
+            for start in range(0, len(lengths), naive_batch_size)
+        )
+        self.stats.sentences += len(inputs)
+        self.stats.truncated += truncated
+        self.stats.real_tokens += sum(lengths)
+        return results
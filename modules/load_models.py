@@ -1,4 +1,6 @@
 import logging
+from functools import partial
+
 import torch
 
 from auto_gptq import AutoGPTQForCausalLM
@@ -17,6 +19,8 @@ from transformers import (
 )
 
 from modules.constants import CONTEXT_WINDOW_SIZE, MAX_NEW_TOKENS, N_GPU_LAYERS, N_BATCH, MODELS_PATH
+from modules.constants import EMBEDDING_MODEL_NAME, MODEL_ID, MODEL_BASENAME
+from modules.model_registry import registry
 
 def load_quantized_model_gguf_ggml(model_id, model_basename, device_type, logging):
     """
@@ -62,7 +66,7 @@ def load_quantized_model_gguf_ggml(model_id, model_basename, device_type, loggin
         return LlamaCpp(**kwargs)
     except:
         if "ggml" in model_basename:
-            logging.INFO("If you were using GGML model, LLAMA-CPP Dropped Support, Use GGUF Instead")
+            logging.info("If you were using GGML model, LLAMA-CPP Dropped Support, Use GGUF Instead")
         return None
 
 def load_quantized_model_qptq(model_id, model_basename, device_type, logging):
@@ -246,4 +250,51 @@ def load_model(device_type, model_id, model_basename=None, LOGGING=logging):
     local_llm = HuggingFacePipeline(pipeline=pipe)
     logging.info("Local LLM Loaded")
 
-    return local_llm
\ No newline at end of file
+    return local_llm
+
+def load_embeddings(device_type, model_name=EMBEDDING_MODEL_NAME):
+    """
+    Load the instruction embeddings used by the vector stores.
+
+    Parameters:
+    - device_type (str): The type of device where the model will run, e.g., 'cpu', 'cuda', etc.
+    - model_name (str): Identifier of the embedding model on HuggingFace Hub.
+
+    Returns:
+    - HuggingFaceInstructEmbeddings: The embedding model.
+    """
+    return HuggingFaceInstructEmbeddings(model_name=model_name, model_kwargs={"device": device_type})
+
+
+def load_llm(device_type, model_id=MODEL_ID, model_basename=MODEL_BASENAME):
+    """
+    Load the LLM with `load_model`, raising instead of returning None when a GGUF/GGML
+    model fails to load, so that the registry never caches a failed load.
+
+    Raises:
+        RuntimeError: If the quantized model could not be loaded.
+    """
+    llm = load_model(device_type, model_id=model_id, model_basename=model_basename, LOGGING=logging)
+    if llm is None:
+        raise RuntimeError(f"Failed to load {model_basename} from {model_id} on {device_type}")
+    return llm
+
+
+def get_llm(device_type, model_id=MODEL_ID, model_basename=MODEL_BASENAME):
+    """
+    Return the LLM for a model and device from the shared model registry, loading it on first use.
+
+    The model and its tokenizer are loaded together by `load_llm` and cached under
+    `(model_id, model_basename, device_type)`, so every pipeline asking for the same
+    model reuses one instance until it is evicted to stay within MODEL_MEMORY_BUDGET_MB.
+    """
+    key = (model_id, model_basename, device_type)
+    registry.register(key, partial(load_llm, device_type, model_id=model_id, model_basename=model_basename))
+    return registry.get(key)
+
+
+def get_embeddings(device_type, model_name=EMBEDDING_MODEL_NAME):
+    """Return the embedding model for a device from the shared model registry, loading it on first use."""
+    key = (model_name, None, device_type)
+    registry.register(key, partial(load_embeddings, device_type, model_name=model_name))
+    return registry.get(key)
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+
+from modules.file_utils import write_atomically
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Prefix of every exported Prometheus metric
+METRICS_PREFIX = "conversation_analysis"
+
+
+class StageStats:
+    """Call count, item count, total time and latency histogram of one stage."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.items = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds, items=1):
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.items += items
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, snapshot):
+        for index, bucket_count in enumerate(snapshot["bucket_counts"]):
+            self.bucket_counts[index] += bucket_count
+        self.count += snapshot["count"]
+        self.items += snapshot["items"]
+        self.total += snapshot["total_seconds"]
+        self.max = max(self.max, snapshot["max_seconds"])
+
+    def quantile(self, q):
+        """Approximate a latency quantile from the histogram (upper bound of its bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (self.max,), self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "items": self.items,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.count if self.count else None,
+            "p50_seconds": self.quantile(0.5),
+            "p95_seconds": self.quantile(0.95),
+            "max_seconds": self.max,
+            "bucket_counts": list(self.bucket_counts),
+        }
+
+
+class Metrics:
+    """
+    Per-stage timing instrumentation with JSON and Prometheus textfile export.
+
+    Stages are timed with the `stage` context manager, the `timed` decorator or the
+    `timed_iter` wrapper for lazy iterators. Times are exclusive: when stages nest, the
+    time spent in the inner stage is not counted again in the outer one, so the stage
+    totals add up to the instrumented wall-clock time.
+
+    Instrumentation is disabled by default and costs a single attribute check per call
+    in that state. Enable it with `enable()` or the CONVERSATION_METRICS=1 environment
+    variable.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=False):
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def observe(self, name, seconds, items=1):
+        """Record one call of a stage that took `seconds` and handled `items` items."""
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats(self.buckets)
+            stats.observe(seconds, items)
+
+    @contextmanager
+    def _timed_stage(self, name, items):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)  # time spent in nested stages
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.observe(name, elapsed - nested, items)
+
+    def stage(self, name, items=1):
+        """Context manager timing the enclosed block as one call of stage `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed_stage(name, items)
+
+    def timed(self, name):
+        """Decorator timing every call of the decorated function as stage `name`."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with self._timed_stage(name, 1):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def timed_iter(self, name, iterable):
+        """Wrap a lazy iterable so that producing each item is timed as stage `name`."""
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(name, iter(iterable))
+
+    def _timed_iter(self, name, iterator):
+        while True:
+            with self._timed_stage(name, 1):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def snapshot(self):
+        """Return a JSON-serialisable summary of every stage recorded so far."""
+        with self._lock:
+            return {
+                "buckets": list(self.buckets),
+                "stages": {name: stats.snapshot() for name, stats in self._stages.items()},
+            }
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process (e.g. a pool worker) to these metrics."""
+        with self._lock:
+            for name, stage_snapshot in snapshot["stages"].items():
+                stats = self._stages.get(name)
+                if stats is None:
+                    stats = self._stages[name] = StageStats(self.buckets)
+                stats.merge(stage_snapshot)
+
+    def export_json(self, path):
+        write_atomically(path, json.dumps(self.snapshot(), indent=2))
+
+    def prometheus_text(self, prefix=METRICS_PREFIX, description="conversation analysis"):
+        """Return the metrics in the Prometheus text format, with metric names starting with `prefix`."""
+        name = f"{prefix}_stage_seconds"
+        lines = [
+            f"# HELP {name} Exclusive latency of {description} stages.",
+            f"# TYPE {name} histogram",
+        ]
+        items_lines = [
+            f"# HELP {prefix}_stage_items_total Items processed by {description} stages.",
+            f"# TYPE {prefix}_stage_items_total counter",
+        ]
+        for stage, stats in sorted(self.snapshot()["stages"].items()):
+            cumulative = 0
+            for bound, bucket_count in zip(
+                [str(bound) for bound in self.buckets] + ["+Inf"], stats["bucket_counts"]
+            ):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats["total_seconds"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+            items_lines.append(f'{prefix}_stage_items_total{{stage="{stage}"}} {stats["items"]}')
+        return "\n".join(lines + items_lines) + "\n"
+
+    def export_prometheus(self, path):
+        """Write the metrics in the Prometheus text format, e.g. for the node_exporter textfile collector."""
+        write_atomically(path, self.prometheus_text())
+
+    def export(self, path):
+        """Export to `path`, as Prometheus text for a .prom file and as JSON otherwise."""
+        if path.endswith(".prom"):
+            self.export_prometheus(path)
+        else:
+            self.export_json(path)
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+# Shared by every module of the process
+metrics = Metrics(enabled=os.environ.get("CONVERSATION_METRICS") == "1")
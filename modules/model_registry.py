@@ -0,0 +1,183 @@
+import os
+import logging
+import threading
+import time
+
+from modules.resources import cuda_allocated_bytes, current_rss_bytes, release_freed_memory
+
+# Memory the loaded models may use together before the least recently used ones are
+# unloaded, in MB of RAM plus GPU memory; unset means no limit
+MODEL_MEMORY_BUDGET_MB = os.environ.get("MODEL_MEMORY_BUDGET_MB")
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of lazily loaded models.
+
+    Models are registered by name together with a loader callable. Nothing is loaded
+    at registration time: the loader runs the first time the model is requested and
+    the instance is kept for the rest of the process, so importing a module that
+    registers models stays cheap.
+
+    Parameters:
+    - memory_budget_bytes (int): Total resident size the loaded models may reach before
+      the least recently used ones are unloaded (Default is no limit).
+
+    Notes:
+    - Loading is guarded by a lock, so concurrent first requests load a model only once.
+    - The time spent in each loader is recorded and can be read with `load_times`.
+    - The resident size of a model is the growth of the process RSS plus CUDA memory
+      while its loader ran. It is remembered after eviction, so room is made before a
+      model is loaded again. `report` lists load times, sizes and last use.
+    - Names can be any hashable value, e.g. a `(model_id, model_basename, device_type)` tuple.
+    """
+
+    def __init__(self, memory_budget_bytes=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._loaders = {}
+        self._models = {}
+        self._load_times = {}
+        self._sizes = {}
+        self._last_used = {}
+        self._pinned = set()
+        self._lock = threading.RLock()
+
+    def register(self, name, loader, replace=False, pinned=False):
+        """
+        Register a loader for a model name.
+
+        Parameters:
+        - name (str): The name the model is requested by.
+        - loader (callable): Zero-argument callable returning the loaded model.
+        - replace (bool): Replace an existing loader and drop its loaded instance.
+          Without it, registering an already known name is a no-op, which keeps
+          models warm when a script (e.g. a Streamlit app) is re-executed.
+        - pinned (bool): Never unload this model to stay within the memory budget,
+          e.g. because other models keep references into it.
+        """
+        with self._lock:
+            if name in self._loaders and not replace:
+                return
+            self._loaders[name] = loader
+            if pinned:
+                self._pinned.add(name)
+            else:
+                self._pinned.discard(name)
+            self._models.pop(name, None)
+            self._load_times.pop(name, None)
+            self._sizes.pop(name, None)
+
+    def get(self, name):
+        """Return the model registered under `name`, loading it on first use."""
+        try:
+            model = self._models[name]
+            self._last_used[name] = time.monotonic()
+            return model
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._models:
+                if name not in self._loaders:
+                    raise KeyError(f"No model registered under '{name}'")
+                # A model loaded before tells how much room it needs
+                self._evict(keep=name, incoming=self._sizes.get(name, 0))
+                logging.info(f"Loading model: {name}")
+                others_before = self.resident_bytes()
+                rss_before = current_rss_bytes()
+                cuda_before = cuda_allocated_bytes()
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self._load_times[name] = time.perf_counter() - start
+                growth = current_rss_bytes() - rss_before + cuda_allocated_bytes() - cuda_before
+                # Models the loader requested itself (e.g. the matcher loading nlp) are counted on their own
+                others_loaded = sum(
+                    self._sizes.get(other, 0) for other in self._models if other != name
+                ) - others_before
+                self._sizes[name] = max(0, growth - others_loaded)
+                logging.info(
+                    f"Model {name} loaded in {self._load_times[name]:.2f}s, "
+                    f"{self._sizes[name] / 2**20:.0f} MB resident"
+                )
+                self._evict(keep=name)
+            self._last_used[name] = time.monotonic()
+            return self._models[name]
+
+    def _evict(self, keep, incoming=0):
+        """Unload least recently used models until the loaded ones plus `incoming` bytes fit the budget."""
+        if self.memory_budget_bytes is None:
+            return
+        candidates = sorted(
+            (name for name in self._models if name != keep and name not in self._pinned),
+            key=lambda name: self._last_used.get(name, 0),
+        )
+        evicted = False
+        for name in candidates:
+            if self.resident_bytes() + incoming <= self.memory_budget_bytes:
+                break
+            logging.info(
+                f"Unloading model {name} ({self._sizes.get(name, 0) / 2**20:.0f} MB) "
+                f"to stay within the {self.memory_budget_bytes / 2**20:.0f} MB model budget"
+            )
+            self._models.pop(name, None)
+            self._load_times.pop(name, None)
+            evicted = True
+        if evicted:
+            release_freed_memory()
+        if self.resident_bytes() + incoming > self.memory_budget_bytes:
+            logging.warning(
+                f"Loaded models use {(self.resident_bytes() + incoming) / 2**20:.0f} MB, "
+                f"more than the {self.memory_budget_bytes / 2**20:.0f} MB budget"
+            )
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def load_times(self):
+        """Return a dict with the load time, in seconds, of every model loaded so far."""
+        return dict(self._load_times)
+
+    def resident_bytes(self):
+        """Return the resident size of the currently loaded models, in bytes."""
+        return sum(self._sizes.get(name, 0) for name in self._models)
+
+    def set_memory_budget(self, memory_budget_bytes):
+        """Change the memory budget, unloading models straight away if they no longer fit."""
+        with self._lock:
+            self.memory_budget_bytes = memory_budget_bytes
+            self._evict(keep=None)
+
+    def report(self):
+        """
+        Return the state of every registered model.
+
+        Returns:
+        - dict: For each name, whether it is loaded, its last load time in seconds, its
+          resident size in bytes (None until first loaded) and the seconds since last use.
+        """
+        now = time.monotonic()
+        return {
+            name: {
+                "loaded": name in self._models,
+                "load_seconds": self._load_times.get(name),
+                "resident_bytes": self._sizes.get(name),
+                "idle_seconds": now - self._last_used[name] if name in self._last_used else None,
+                "pinned": name in self._pinned,
+            }
+            for name in self._loaders
+        }
+
+    def unload(self, name):
+        """Drop a loaded instance; it will be loaded again on the next request."""
+        with self._lock:
+            self._models.pop(name, None)
+            self._load_times.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._loaders
+
+
+# Shared by every module of the process
+registry = ModelRegistry(
+    memory_budget_bytes=int(float(MODEL_MEMORY_BUDGET_MB) * 2**20) if MODEL_MEMORY_BUDGET_MB else None
+)
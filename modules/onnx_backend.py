@@ -0,0 +1,111 @@
+import os
+import logging
+
+# Exported ONNX models are stored next to the other downloaded models
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+ONNX_MODELS_PATH = f"{ROOT_DIRECTORY}/models/onnx"
+
+QUANTIZED_FILE_NAME = "model_quantized.onnx"
+
+
+def default_intra_op_threads():
+    """Use OMP_NUM_THREADS when set, otherwise one ONNX Runtime thread per physical core."""
+    if os.environ.get("OMP_NUM_THREADS", "").isdigit():
+        return int(os.environ["OMP_NUM_THREADS"])
+    try:
+        import psutil
+
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+
+def export_onnx_classifier(model_id, quantize=False, models_path=ONNX_MODELS_PATH):
+    """
+    Export a HuggingFace sequence classifier to ONNX, optionally with dynamic int8 quantization.
+
+    The export and the quantized copy are written once under `models_path` and reused on
+    later calls.
+
+    Parameters:
+    - model_id (str): The identifier of the model on HuggingFace Hub.
+    - quantize (bool): Also produce a dynamically int8-quantized copy of the model.
+    - models_path (str): Directory holding the exported models.
+
+    Returns:
+    - tuple: The directory of the exported model and the ONNX file name to load.
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    export_directory = os.path.join(models_path, model_id.replace("/", "--"))
+    if not os.path.exists(os.path.join(export_directory, "model.onnx")):
+        logging.info(f"Exporting {model_id} to ONNX in {export_directory}")
+        model = ORTModelForSequenceClassification.from_pretrained(model_id, export=True)
+        model.save_pretrained(export_directory)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(export_directory)
+
+    if not quantize:
+        return export_directory, "model.onnx"
+
+    quantized_directory = f"{export_directory}-int8"
+    if not os.path.exists(os.path.join(quantized_directory, QUANTIZED_FILE_NAME)):
+        logging.info(f"Quantizing {model_id} to int8 in {quantized_directory}")
+        quantizer = ORTQuantizer.from_pretrained(export_directory)
+        # Dynamic quantization: int8 weights, activations quantized on the fly
+        quantization_config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=quantized_directory, quantization_config=quantization_config)
+        AutoTokenizer.from_pretrained(export_directory).save_pretrained(quantized_directory)
+    return quantized_directory, QUANTIZED_FILE_NAME
+
+
+def load_onnx_pipeline(
+    model_id,
+    task="text-classification",
+    quantize=False,
+    intra_op_threads=None,
+    models_path=ONNX_MODELS_PATH,
+    **pipeline_kwargs,
+):
+    """
+    Load a sequence classifier as a transformers pipeline served by ONNX Runtime on CPU.
+
+    Parameters:
+    - model_id (str): The identifier of the model on HuggingFace Hub.
+    - task (str): The pipeline task.
+    - quantize (bool): Serve the dynamically int8-quantized model.
+    - intra_op_threads (int): Threads used inside each operator (default: physical cores).
+    - pipeline_kwargs: Extra arguments for `transformers.pipeline`, e.g. return_all_scores.
+
+    Returns:
+    - Pipeline: A pipeline with the same call signature and outputs as the PyTorch one.
+
+    Notes:
+    - Sessions run operators sequentially with a single inter-op thread, which is the
+      fastest setting for these small encoder models on CPU.
+    """
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import AutoTokenizer, pipeline
+
+    model_directory, file_name = export_onnx_classifier(
+        model_id, quantize=quantize, models_path=models_path
+    )
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = intra_op_threads or default_intra_op_threads()
+    session_options.inter_op_num_threads = 1
+    session_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    session_options.graph_optimization_level = (
+        onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    )
+
+    model = ORTModelForSequenceClassification.from_pretrained(
+        model_directory,
+        file_name=file_name,
+        session_options=session_options,
+        provider="CPUExecutionProvider",
+    )
+    tokenizer = AutoTokenizer.from_pretrained(model_directory)
+    return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs)
@@ -0,0 +1,142 @@
+import os
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PARQUET_COMPRESSION = "zstd"
+
+
+def results_schema(columns, categorical_columns):
+    """
+    Arrow schema of the analysed rows, matching ColumnarResults.to_arrow().
+
+    Categorical columns are dictionary-encoded strings, so they are read back as pandas
+    categoricals; the other columns are plain strings.
+    """
+    return pa.schema(
+        [
+            (name, pa.dictionary(pa.int32(), pa.string()) if name in categorical_columns else pa.large_string())
+            for name in columns
+        ]
+    )
+
+
+def constant_column(value, length):
+    """Dictionary-encoded column repeating one string value, without materialising the strings."""
+    return pa.DictionaryArray.from_arrays(
+        pa.array(np.zeros(length, dtype=np.int32)), pa.array([value], pa.string())
+    )
+
+
+def partition_directory(root, partition_by, value):
+    """Hive-style directory of one partition, e.g. `<root>/source_file=chats%2Fa.txt`."""
+    return os.path.join(root, f"{partition_by}={quote(str(value), safe='')}")
+
+
+class PartitionedParquetWriter:
+    """
+    Writes tables into a Hive-partitioned Parquet dataset, one row group per write.
+
+    Each partition gets one open ParquetWriter with the fixed schema, so chunks are
+    streamed to disk as they are produced and every file has the same column types. Files
+    are written under a temporary name and renamed into place on close, so readers never
+    see a partial file.
+
+    Parameters:
+    - root (str): Directory of the dataset.
+    - schema (pyarrow.Schema): Schema of the tables written, without the partition column.
+    - partition_by (str): Name of the partition column, e.g. "source_file" or "analysis_date".
+    - file_name (str): Name of the file written in each partition (Default is part-0.parquet).
+    - compression (str): Parquet compression codec.
+    """
+
+    def __init__(self, root, schema, partition_by, file_name="part-0.parquet", compression=PARQUET_COMPRESSION):
+        self.root = root
+        self.schema = schema
+        self.partition_by = partition_by
+        self.file_name = file_name
+        self.compression = compression
+        self.writers = {}
+
+    def write(self, table, partition_value):
+        writer = self.writers.get(partition_value)
+        if writer is None:
+            directory = partition_directory(self.root, self.partition_by, partition_value)
+            os.makedirs(directory, exist_ok=True)
+            # Dot-prefixed, so dataset scans skip files that are still being written
+            temporary_path = os.path.join(directory, f".{self.file_name}.tmp")
+            writer = pq.ParquetWriter(temporary_path, self.schema, compression=self.compression)
+            self.writers[partition_value] = writer
+        writer.write_table(table.cast(self.schema))
+
+    def close(self):
+        """Finish every partition file and return their paths."""
+        paths = []
+        for writer in self.writers.values():
+            writer.close()
+            path = os.path.join(os.path.dirname(writer.where), self.file_name)
+            os.replace(writer.where, path)
+            paths.append(path)
+        self.writers = {}
+        return paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def is_parquet_dataset(path):
+    """True when `path` is a directory written by PartitionedParquetWriter."""
+    return os.path.isdir(path) and any(
+        "=" in name and os.path.isdir(os.path.join(path, name)) for name in os.listdir(path)
+    )
+
+
+def dataset_partitions(root):
+    """
+    Return the partition column of a dataset and its values, read from the directory names only.
+
+    Returns:
+    - tuple: The partition column name (None for an empty dataset) and the sorted values.
+    """
+    partition_by = None
+    values = []
+    for name in os.listdir(root):
+        if "=" in name and os.path.isdir(os.path.join(root, name)):
+            partition_by, value = name.split("=", 1)
+            values.append(unquote(value))
+    return partition_by, sorted(values)
+
+
+def read_parquet_dataset(root, columns=None, partitions=None, filter=None):
+    """
+    Read a partitioned dataset into pandas, touching only the requested columns and partitions.
+
+    Parameters:
+    - root (str): Directory of the dataset.
+    - columns (list[str]): Columns to read, possibly including the partition column (Default is all).
+    - partitions (list[str]): Partition values to read (Default is all).
+    - filter (pyarrow.compute.Expression): Extra row filter pushed down to the scan.
+
+    Returns:
+    - DataFrame: The rows, with dictionary-encoded columns as categoricals.
+    """
+    partition_by, _ = dataset_partitions(root)
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        partitioning=ds.HivePartitioning.discover(
+            schema=pa.schema([(partition_by, pa.dictionary(pa.int32(), pa.string()))])
+            if partition_by
+            else None
+        ),
+    )
+    if partitions is not None:
+        partition_filter = ds.field(partition_by).isin(partitions)
+        filter = partition_filter if filter is None else filter & partition_filter
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
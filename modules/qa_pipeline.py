@@ -1,11 +1,5 @@
-import logging
-
 from langchain.chains import RetrievalQA
 from langchain.vectorstores import Chroma
-from langchain.vectorstores import FAISS
-from langchain.document_loaders import PyPDFLoader, DirectoryLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceInstructEmbeddings
 from langchain.callbacks.streaming_stdout import (
     StreamingStdOutCallbackHandler,
 )  # for streaming response
@@ -14,17 +8,16 @@ from langchain.callbacks.manager import CallbackManager
 callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
 
 from modules.prompt_template import get_prompt_template
+from modules.faiss_store import update_faiss_index
 
 from modules.load_models import (
-    load_model,
+    get_embeddings,
+    get_llm,
 )
 
 from modules.constants import (
-    EMBEDDING_MODEL_NAME,
     PERSIST_DIRECTORY,
     CHROMA_SETTINGS,
-    MODEL_ID,
-    MODEL_BASENAME,
 )
 
 def retrieval_qa_pipeline(
@@ -46,15 +39,15 @@ def retrieval_qa_pipeline(
     Notes:
     - The function uses embeddings from the HuggingFace library, either instruction-based or regular.
     - The Chroma class is used to load a vector store containing pre-computed embeddings.
+    - Without Chroma, the FAISS index of the documents in data/ is kept in PERSIST_DIRECTORY
+      and only updated for the files added, changed or removed since the last run.
     - The retriever fetches relevant documents or data based on a query.
     - The prompt and memory, obtained from the `get_prompt_template` function, might be used in the QA system.
     - The model is loaded onto the specified device using its ID and basename.
     - The QA system retrieves relevant documents using the retriever and then answers questions based on those documents.
     """
 
-    embeddings = HuggingFaceInstructEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME, model_kwargs={"device": device_type}
-    )
+    embeddings = get_embeddings(device_type)
     # uncomment the following line if you used HuggingFaceEmbeddings in the ingest.py
     # embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
 
@@ -67,18 +60,8 @@ def retrieval_qa_pipeline(
         )
         retriever = db.as_retriever()
     else:
-        loader = DirectoryLoader("data/", glob="*.pdf", loader_cls=PyPDFLoader)
-
-        documents = loader.load()
-        # print(documents)
-
-        # ***Step 2: Split Text into Chunks***
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-
-        text_chunks = text_splitter.split_documents(documents)
-        print(len(text_chunks))
-        # Convert the Text Chunks into Embeddings and Create a FAISS Vector Store***
-        vector_store = FAISS.from_documents(text_chunks, embeddings)
+        # Only files added or changed since the last run are split and embedded again
+        vector_store = update_faiss_index(embeddings)
         retriever = vector_store.as_retriever(search_kwargs={"k": 2})
 
     # get the prompt template and memory if set by the user.
@@ -86,10 +69,8 @@ def retrieval_qa_pipeline(
         promptTemplate_type=promptTemplate_type, history=use_history
     )
 
-    # load the llm pipeline
-    llm = load_model(
-        device_type, model_id=MODEL_ID, model_basename=MODEL_BASENAME, LOGGING=logging
-    )
+    # load the llm pipeline, or reuse the one already in the model registry
+    llm = get_llm(device_type)
 
     if use_history:
         qa = RetrievalQA.from_chain_type(
@@ -118,18 +99,31 @@ def question_pipeline(
     device_type,
     use_history,
     question,
-    promptTemplate_type="question"
+    promptTemplate_type="question",
+    llm=None,
 ):
+    """
+    Answers a single question with the LLM.
+
+    Parameters:
+    - device_type (str): Specifies the type of device where the model will run, e.g., 'cpu', 'cuda', etc.
+    - use_history (bool): Flag to determine whether to use chat history or not.
+    - question (str): The question to answer.
+    - llm: An already loaded model, e.g. kept warm by llm_server.py. When None, the
+      model is taken from the model registry and loaded on first use.
+
+    Returns:
+    - str: The generated answer.
+    """
 
     # get the prompt template and memory if set by the user.
     prompt, memory = get_prompt_template(
         promptTemplate_type=promptTemplate_type, history=use_history
     )
 
-    # load the llm pipeline
-    llm = load_model(
-        device_type, model_id=MODEL_ID, model_basename=MODEL_BASENAME, LOGGING=logging
-    )
+    # load the llm pipeline, or reuse the one already in the model registry
+    if llm is None:
+        llm = get_llm(device_type)
 
     chain = prompt | llm
 
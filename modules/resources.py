@@ -0,0 +1,125 @@
+import gc
+import os
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss_bytes():
+    """
+    Return the current resident set size of this process, in bytes.
+
+    Uses psutil when it is installed, then /proc on Linux, and falls back to the
+    peak RSS when neither is available.
+    """
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process so far, in bytes (0 if unknown)."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def status_bytes(field):
+    """Return a memory field of /proc/self/status (e.g. VmHWM) in bytes, or None where unavailable."""
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """
+    Reset the peak RSS mark of this process (VmHWM) to its current RSS.
+
+    Returns:
+    - bool: True if the kernel supports it (Linux, by writing 5 to /proc/self/clear_refs).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return status_bytes("VmHWM") is not None
+
+
+class PeakRssTracker:
+    """
+    Measures the peak RSS reached while the `with` block runs, rather than since the
+    process started.
+
+    On Linux the kernel's high-water mark is reset on entry and read on exit. Elsewhere
+    the current RSS is sampled every `interval` seconds from a background thread, which
+    can miss a spike shorter than the interval.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = None
+        self._sampler = None
+
+    def __enter__(self):
+        self.peak_bytes = current_rss_bytes()
+        if not reset_peak_rss():
+            self._stop = threading.Event()
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+
+    def __exit__(self, *exc_info):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+        else:
+            self.peak_bytes = max(self.peak_bytes, status_bytes("VmHWM") or 0)
+        return False
+
+
+def cuda_allocated_bytes():
+    """
+    Return the memory currently allocated by torch on CUDA devices, in bytes.
+
+    Returns 0 when torch has not been imported by this process or has no GPU, so
+    calling it never pulls torch in.
+    """
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return 0
+    return sum(torch.cuda.memory_allocated(device) for device in range(torch.cuda.device_count()))
+
+
+def release_freed_memory():
+    """Collect garbage and return cached CUDA blocks, so dropped models actually free memory."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
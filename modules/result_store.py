@@ -0,0 +1,154 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+class CategoricalColumn:
+    """
+    Low-cardinality string column stored as small integer codes plus a list of categories.
+
+    Codes live in an `array` that starts as int8 and widens automatically if the
+    number of categories grows; None is stored as code -1.
+    """
+
+    def __init__(self):
+        self.categories = []
+        self.category_codes = {}
+        self.codes = array("b")
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.category_codes.get(value)
+        if code is None:
+            code = self.category_codes[value] = len(self.categories)
+            self.categories.append(value)
+            if code > 127 and self.codes.typecode == "b":
+                self.codes = array("i", self.codes)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(
+            len(category.encode("utf-8")) for category in self.categories
+        )
+
+    def code_array(self):
+        # A view over the array's buffer, not a copy
+        return np.frombuffer(self.codes, dtype=np.int8 if self.codes.typecode == "b" else np.int32)
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        codes = self.code_array()
+        indices = pa.array(codes, mask=codes < 0) if (codes < 0).any() else pa.array(codes)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(self.categories, pa.string()))
+
+    def to_pandas(self):
+        return pd.Categorical.from_codes(self.code_array(), categories=self.categories)
+
+
+class TextColumn:
+    """
+    Free-text column stored in the Arrow layout: one UTF-8 buffer plus int64 offsets.
+
+    Strings are not kept as Python objects, so each row costs its UTF-8 bytes plus
+    8 bytes of offset. None is tracked in a validity list only once it first occurs.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("q", [0])
+        self.valid = None
+
+    def append(self, value):
+        if value is None:
+            if self.valid is None:
+                self.valid = bytearray(b"\x01") * (len(self.offsets) - 1)
+            self.valid.append(0)
+        else:
+            self.data += value.encode("utf-8")
+            if self.valid is not None:
+                self.valid.append(1)
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets) + len(self.valid or b"")
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        validity = None
+        null_count = 0
+        if self.valid is not None:
+            valid = np.frombuffer(self.valid, dtype=np.uint8)
+            null_count = int(len(valid) - valid.sum())
+            validity = pa.py_buffer(np.packbits(valid, bitorder="little"))
+        # The offsets and data buffers are shared with Arrow, not copied
+        return pa.Array.from_buffers(
+            pa.large_string(),
+            len(self),
+            [validity, pa.py_buffer(self.offsets), pa.py_buffer(self.data)],
+            null_count=null_count,
+        )
+
+    def to_pandas(self):
+        return pd.arrays.ArrowExtensionArray(self.to_arrow())
+
+
+class ColumnarResults:
+    """
+    Columnar builder for analysed rows, used instead of a list of dicts.
+
+    Rows are appended one at a time (or a chunk at a time) and split into array-backed
+    columns straight away: low-cardinality columns such as the actor, the sentence type
+    and the sentiment labels are categorical codes, and free-text columns share one
+    UTF-8 buffer each.
+
+    Parameters:
+    - columns (list[str]): Column names, in output order.
+    - categorical_columns (list[str]): The columns to encode as categories.
+
+    Notes:
+    - `to_arrow` and `to_pandas` wrap the column buffers instead of copying them;
+      text columns become Arrow-backed pandas string columns.
+    - Appending after a conversion is not supported, since the buffers are shared.
+    """
+
+    def __init__(self, columns, categorical_columns):
+        self.columns = {
+            name: CategoricalColumn() if name in categorical_columns else TextColumn()
+            for name in columns
+        }
+
+    def append(self, row):
+        for name, column in self.columns.items():
+            column.append(row[name])
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def nbytes(self):
+        """Return the memory held by the column buffers, in bytes."""
+        return sum(column.nbytes() for column in self.columns.values())
+
+    def to_arrow(self):
+        import pyarrow as pa
+
+        return pa.table({name: column.to_arrow() for name, column in self.columns.items()})
+
+    def to_pandas(self):
+        return pd.DataFrame(
+            {name: column.to_pandas() for name, column in self.columns.items()}, copy=False
+        )
@@ -0,0 +1,67 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def words_pattern(words):
+    """Build a regex alternation from a list of words, longest first, with the words escaped."""
+    return "|".join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+
+
+class SentenceClassifier:
+    """
+    Precompiled sentence classifier (Question, Command or Statement).
+
+    The rules are compiled once from the word lists into two regular expressions:
+    one covering every question check (trailing question mark, leading interrogative
+    word, interrogative word followed by a comma) and one for the leading imperative
+    verb. A sentence is then classified with at most two regex scans instead of
+    repeated Python loops over the word lists.
+
+    Parameters:
+    - interrogative_words (list[str]): Words that mark a question.
+    - command_verbs (list[str]): Imperative verbs that mark a command.
+    """
+
+    def __init__(self, interrogative_words, command_verbs):
+        interrogatives = words_pattern(interrogative_words)
+        self.question_pattern = re.compile(
+            rf"\?\Z|^(?:{interrogatives})|(?:{interrogatives}),"
+        )
+        self.command_pattern = re.compile(rf"(?:{words_pattern(command_verbs)})")
+        self.whitespace_pattern = re.compile(r"\s+")
+
+    def clean(self, text):
+        return self.whitespace_pattern.sub(" ", text.strip()).lower()
+
+    def classify(self, text):
+        """Classify a single sentence given as text."""
+        cleaned_text = self.clean(text)
+        if self.question_pattern.search(cleaned_text):
+            return "Question"
+        if self.command_pattern.match(cleaned_text):
+            return "Command"
+        return "Statement"
+
+    def classify_series(self, sentences):
+        """
+        Classify a whole pandas Series of sentences at once.
+
+        Returns:
+        - pd.Series: The labels, aligned with the index of `sentences`, identical to
+          calling `classify` on each sentence.
+        """
+        cleaned = (
+            sentences.astype(object)
+            .fillna("")
+            .str.strip()
+            .str.replace(self.whitespace_pattern, " ", regex=True)
+            .str.lower()
+        )
+        is_question = cleaned.str.contains(self.question_pattern).to_numpy(dtype=bool)
+        is_command = cleaned.str.match(self.command_pattern).to_numpy(dtype=bool)
+        labels = np.where(
+            is_question, "Question", np.where(is_command, "Command", "Statement")
+        )
+        return pd.Series(labels, index=sentences.index, dtype=object)
@@ -0,0 +1,238 @@
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+# Keys are looked up and refreshed in groups of this size to stay below SQLite's variable limit
+SQLITE_BATCH_SIZE = 500
+
+# A hit only rewrites last_used when it is older than this, so lookups rarely write;
+# LRU eviction stays accurate to about a day
+LAST_USED_REFRESH_SECONDS = 86400
+
+# The cache size is checked after this fraction of max_entries has been stored by an
+# instance, instead of counting rows on every store; eviction trims to 90% of the bound
+EVICTION_CHECK_FRACTION = 0.1
+
+
+def normalize_sentence(sentence):
+    """Normalize a sentence for cache lookups: NFC unicode, collapsed and stripped whitespace.
+
+    Case is kept, since both sentiment models are cased.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", sentence)).strip()
+
+
+class SentimentCache:
+    """
+    Persistent, content-addressed cache of per-sentence sentiment results, backed by SQLite.
+
+    Entries are keyed by a hash of the normalized sentence and of the ids of both
+    sentiment models, so changing a model never serves stale results. Each model's
+    label is stored on its own, so a sentence only one model ran on (e.g. in the
+    single-model or cascade modes) is cached too and completed later. The cache keeps
+    at most `max_entries` rows and evicts the least recently used ones when it grows
+    past that bound.
+
+    Parameters:
+    - path (str): Location of the SQLite database file, created if missing.
+    - model_ids (tuple[str, str]): Ids of the DistilBERT and RoBERTa models.
+    - max_entries (int): Maximum number of cached sentences.
+
+    Notes:
+    - Several processes can share the same file, and threads can share an instance;
+      each process and thread opens its own connection.
+    - Hit, miss and eviction counters are kept per instance and returned by `stats`.
+    - The bound is checked every EVICTION_CHECK_FRACTION of `max_entries` stores, so
+      each process can exceed it by about that much before old entries are evicted.
+    """
+
+    def __init__(self, path, model_ids, max_entries=1_000_000):
+        self.path = path
+        self.model_ids = tuple(model_ids)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._stored_since_check = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._pid = None
+
+    @property
+    def connection(self):
+        # Connections must not cross a fork or be shared between threads (e.g. the
+        # thread pools of the staged pipeline), so each process and thread opens its own
+        if self._pid != os.getpid():
+            self._local = threading.local()
+            self._connections = []
+            self._pid = os.getpid()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Only used by this thread; check_same_thread=False lets `close` close it from another
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sentiment_labels (
+                    key TEXT PRIMARY KEY,
+                    distilbert TEXT,
+                    distilbert_confidence REAL,
+                    roberta TEXT,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS sentiment_labels_last_used ON sentiment_labels (last_used)"
+            )
+            connection.commit()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def key(self, sentence):
+        """Return the cache key of a sentence for the configured models."""
+        content = "\0".join(self.model_ids + (normalize_sentence(sentence),))
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get_many(self, sentences):
+        """
+        Look up sentiment results for a list of sentences.
+
+        Returns:
+        - dict: Maps each cached sentence to its (distilbert, distilbert_confidence,
+          roberta) tuple, with None for a model that has not labelled it yet.
+        """
+        keys = {}
+        for sentence in sentences:
+            keys.setdefault(self.key(sentence), []).append(sentence)
+
+        found = {}
+        stale = []
+        key_list = list(keys)
+        now = time.time()
+        for start in range(0, len(key_list), SQLITE_BATCH_SIZE):
+            batch = key_list[start : start + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT key, distilbert, distilbert_confidence, roberta, last_used FROM sentiment_labels "
+                f"WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, *labels, last_used in rows:
+                for sentence in keys[key]:
+                    found[sentence] = tuple(labels)
+                if last_used < now - LAST_USED_REFRESH_SECONDS:
+                    stale.append(key)
+        if stale:
+            for start in range(0, len(stale), SQLITE_BATCH_SIZE):
+                batch = stale[start : start + SQLITE_BATCH_SIZE]
+                self.connection.execute(
+                    f"UPDATE sentiment_labels SET last_used = ? WHERE key IN ({','.join('?' * len(batch))})",
+                    [now] + batch,
+                )
+            self.connection.commit()
+
+        hits = sum(sentence in found for sentence in sentences)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(sentences) - hits
+        return found
+
+    def put_many(self, results):
+        """
+        Store (sentence, (distilbert, distilbert_confidence, roberta)) pairs and evict old
+        entries when the periodic size check finds the cache over its bound. A None
+        label keeps the one already cached for that model.
+        """
+        now = time.time()
+        results = list(results)
+        self.connection.executemany(
+            """
+            INSERT INTO sentiment_labels (key, distilbert, distilbert_confidence, roberta, last_used)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                distilbert = COALESCE(excluded.distilbert, distilbert),
+                distilbert_confidence = COALESCE(excluded.distilbert_confidence, distilbert_confidence),
+                roberta = COALESCE(excluded.roberta, roberta),
+                last_used = excluded.last_used
+            """,
+            [
+                (self.key(sentence), distilbert, confidence, roberta, now)
+                for sentence, (distilbert, confidence, roberta) in results
+            ],
+        )
+        self.connection.commit()
+        with self._lock:
+            self._stored_since_check += len(results)
+            check = self._stored_since_check >= max(1, self.max_entries * EVICTION_CHECK_FRACTION)
+            if check:
+                self._stored_since_check = 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries once the cache exceeds `max_entries`.
+
+        The cache is trimmed to 90% of the bound, so eviction does not run on every insert.
+        """
+        entries = self.connection.execute("SELECT COUNT(*) FROM sentiment_labels").fetchone()[0]
+        if entries <= self.max_entries:
+            return 0
+
+        excess = entries - int(self.max_entries * 0.9)
+        self.connection.execute(
+            """
+            DELETE FROM sentiment_labels WHERE key IN (
+                SELECT key FROM sentiment_labels ORDER BY last_used ASC LIMIT ?
+            )
+            """,
+            (excess,),
+        )
+        self.connection.commit()
+        with self._lock:
+            self.evictions += excess
+        return excess
+
+    def stats(self):
+        """Return the hit/miss/eviction counters of this instance and the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self.connection.execute("SELECT COUNT(*) FROM sentiment_labels").fetchone()[0],
+        }
+
+    def __getstate__(self):
+        # Sent to worker processes without the connections and locks, which they recreate
+        state = self.__dict__.copy()
+        for name in ("_lock", "_local", "_connections", "_pid"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._pid = None
+
+    def close(self):
+        """Close the connections every thread of this process opened."""
+        if self._pid == os.getpid():
+            with self._lock:
+                for connection in self._connections:
+                    connection.close()
+        self._local = threading.local()
+        self._connections = []
@@ -0,0 +1,167 @@
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Items waiting between two stages; a full queue blocks the stage before it
+STAGE_QUEUE_SIZE = 2
+
+# How often blocked stage threads check whether the pipeline was stopped
+POLL_SECONDS = 0.05
+
+EXECUTORS = ["thread", "process"]
+
+_DONE = object()
+
+
+class _Failure:
+    """An exception raised in a stage, passed down the queues to the consumer."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class Stage:
+    """
+    One step of a StagedPipeline.
+
+    Parameters:
+    - name (str): Stage name, used for the thread name.
+    - function (callable): Applied to every item; must be picklable with processes.
+    - workers (int): Items processed concurrently by this stage.
+    - initializer (callable): Run once in every worker process, e.g. to load models.
+    - initargs (tuple): Arguments of `initializer`.
+    """
+
+    def __init__(self, name, function, workers=1, initializer=None, initargs=()):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.initializer = initializer
+        self.initargs = initargs
+
+    def executor(self, kind):
+        if kind == "process":
+            # Forking copies the stage threads' locks and the models loaded by the parent,
+            # so workers are spawned and load what they need through `initializer`
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        if kind == "thread":
+            if self.initializer is not None:
+                self.initializer(*self.initargs)
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        raise ValueError(f"Unknown executor '{kind}', expected one of {EXECUTORS}")
+
+
+def _put(target, item, stop):
+    """Put an item on a bounded queue, giving up when the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _feed(items, outbox, stop):
+    try:
+        for item in items:
+            if not _put(outbox, item, stop):
+                return
+    except Exception as error:
+        _put(outbox, _Failure(error), stop)
+        return
+    _put(outbox, _DONE, stop)
+
+
+def _run_stage(stage, pool, inbox, outbox, stop):
+    in_flight = deque()
+    finished = False
+    while not stop.is_set():
+        # Hand results on in input order, waiting for the oldest one when every
+        # worker is busy or the input is exhausted
+        while in_flight and (
+            in_flight[0].done() or len(in_flight) >= stage.workers or finished
+        ):
+            try:
+                result = in_flight.popleft().result()
+            except Exception as error:
+                result = _Failure(error)
+            if not _put(outbox, result, stop) or isinstance(result, _Failure):
+                return
+        if finished:
+            _put(outbox, _DONE, stop)
+            return
+
+        try:
+            item = inbox.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            finished = True
+        elif isinstance(item, _Failure):
+            _put(outbox, item, stop)
+            return
+        else:
+            in_flight.append(pool.submit(stage.function, item))
+
+
+def run_stages(items, stages, executor="thread", queue_size=STAGE_QUEUE_SIZE):
+    """
+    Run items through a chain of stages concurrently, yielding the results in input order.
+
+    Every stage has its own pool of `stage.workers` threads or processes and a driver
+    thread that moves items from the stage's input queue into the pool. Stages are
+    connected by queues of `queue_size` items, so a slow stage holds back the ones before
+    it instead of letting items pile up in memory. Each stage hands its results on in
+    the order it received the items, so the output order matches the input order.
+
+    Parameters:
+    - items (iterable): The inputs of the first stage, consumed lazily.
+    - stages (list[Stage]): The stages, in order.
+    - executor (str): "thread" or "process" (see EXECUTORS).
+    - queue_size (int): Capacity of each queue between stages.
+
+    Notes:
+    - An exception in a stage or in `items` stops the pipeline and is raised to the
+      consumer. Closing the generator early also stops every stage.
+    - Threads overlap stages whose work releases the GIL (model forward passes, spaCy's
+      compiled components). Models shared by several threads of the same stage must be
+      thread-safe, so use processes for more than one worker per model stage.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    pools = [stage.executor(executor) for stage in stages]
+    threads = [threading.Thread(target=_feed, args=(items, queues[0], stop), daemon=True)]
+    for stage, pool, inbox, outbox in zip(stages, pools, queues, queues[1:]):
+        threads.append(
+            threading.Thread(
+                target=_run_stage,
+                args=(stage, pool, inbox, outbox, stop),
+                name=f"stage-{stage.name}",
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)